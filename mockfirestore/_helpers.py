@@ -1,15 +1,17 @@
+import math
 import operator
 import random
 import string
-from datetime import datetime as dt
+import time
+from copy import deepcopy
+from datetime import datetime as dt, timedelta, timezone
 from functools import reduce
-from typing import (Dict, Any, Tuple, TypeVar, Sequence, Iterator)
+from typing import (Dict, Any, Tuple, TypeVar, Sequence, Iterator, Union)
 
 T = TypeVar('T')
 KeyValuePair = Tuple[str, Dict[str, Any]]
 Document = Dict[str, Any]
 Collection = Dict[str, Document]
-Store = Dict[str, Collection]
 
 
 def get_by_path(data: Dict[str, T], path: Sequence[str]) -> T:
@@ -27,30 +29,258 @@ def delete_by_path(data: Dict[str, T], path: Sequence[str]):
     del get_by_path(data, path[:-1])[path[-1]]
 
 
+class _Missing:
+    """Marks a field that is absent from a document."""
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+def get_field_value(document: Document, path: Sequence[str]) -> Any:
+    """Read a nested field by pre-split path, returning MISSING if absent."""
+    value = document
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return MISSING
+        value = value[key]
+    return value
+
+
+def project_fields(document: Document, paths: Sequence[Sequence[str]]) -> Document:
+    """Deep copy only the fields at these pre-split paths out of a document."""
+    projected = {}  # type: Document
+    for path in paths:
+        value = get_field_value(document, path)
+        if value is MISSING:
+            continue
+        target = projected
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = deepcopy(value)
+    return projected
+
+
+def get_type_order(value: Any) -> int:
+    """Rank of a value's type in Firestore's cross-type ordering."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, (dt, Timestamp)):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, (list, tuple)):
+        return 8
+    if isinstance(value, dict):
+        return 10
+    type_name = value.__class__.__name__
+    if type_name == 'DocumentReference':
+        return 6
+    if type_name == 'GeoPoint':
+        return 7
+    if type_name == 'Vector':
+        return 9
+    return 10
+
+
+def get_sort_key(value: Any) -> Tuple[int, Any]:
+    """A key ordering values of any type the way Firestore orders them."""
+    type_order = get_type_order(value)
+    if type_order == 2:
+        # NaN sorts before every other number.
+        return type_order, (0, 0) if value != value else (1, value)
+    if type_order == 3:
+        return type_order, value._nanoseconds if isinstance(value, Timestamp) else datetime_nanoseconds(value)
+    if type_order == 6:
+        return type_order, tuple(value._path)
+    if type_order == 7:
+        return type_order, (value.latitude, value.longitude)
+    if type_order == 8:
+        return type_order, tuple(get_sort_key(item) for item in value)
+    if type_order == 9:
+        return type_order, (len(value), tuple(value))
+    if type_order == 10:
+        if not isinstance(value, dict):
+            return type_order, ()
+        return type_order, tuple((key, get_sort_key(item)) for key, item in sorted(value.items()))
+    return type_order, value
+
+
+def get_equality_key(value: Any) -> Tuple[int, Any]:
+    """
+    A key equal for two values exactly when Firestore holds them equal: of
+    the same type, ranked as in `get_type_order`, and equal within it. So
+    `True` never equals `1`, while `1` equals `1.0`. Arrays and maps get
+    hashable keys; values of unknown types keep their own equality.
+    """
+    type_order = get_type_order(value)
+    if type_order == 8:
+        return type_order, tuple(get_equality_key(item) for item in value)
+    if type_order == 10:
+        if not isinstance(value, dict):
+            return type_order, value
+        return type_order, tuple((key, get_equality_key(value[key])) for key in sorted(value))
+    return get_sort_key(value)
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError('MockFirestore._data is a read-only copy of the store; write through '
+                    'document references, or assign a whole new _data')
+
+
+class ReadOnlyDict(dict):
+    """A dict that raises TypeError on modification, copying to a plain dict."""
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    __ior__ = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class ReadOnlyList(list):
+    """A list that raises TypeError on modification, copying to a plain list."""
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def read_only(value: Any) -> Any:
+    """Wrap the dicts and lists nested in a value so that none can be modified."""
+    if isinstance(value, dict):
+        return ReadOnlyDict((key, read_only(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ReadOnlyList(read_only(item) for item in value)
+    return value
+
+
 def generate_random_string():
     return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(20))
 
 
+# Nanoseconds since the epoch; `time.time_ns` needs Python 3.7.
+time_ns = getattr(time, 'time_ns', lambda: int(time.time() * 1e9))
+
+_EPOCH = dt(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_NANOS_PER_SECOND = 10 ** 9
+
+
+def datetime_nanoseconds(value: dt) -> int:
+    """Nanoseconds since the epoch of a datetime; naive ones are local time, as `dt.timestamp` has it."""
+    if value.tzinfo is None:
+        # `astimezone` rejects naive datetimes before Python 3.6.
+        return int(time.mktime(value.timetuple())) * _NANOS_PER_SECOND + value.microsecond * 1000
+    return (value - _EPOCH) // _MICROSECOND * 1000
+
+
 class Timestamp:
     """
-    Imitates some properties of `google.protobuf.timestamp_pb2.Timestamp`
+    Imitates `google.protobuf.timestamp_pb2.Timestamp`: a time as whole
+    `seconds` since the epoch and `nanos` within the second, both ints.
+
+    It is held as one int of nanoseconds, so timestamps compare and hash
+    exactly, and sort among themselves and with datetimes.
     """
+    __slots__ = ('_nanoseconds',)
+
+    def __init__(self, seconds: Union[int, float] = 0, nanos: int = 0) -> None:
+        if isinstance(seconds, float):
+            # Split first: the fraction alone keeps every digit the float has.
+            whole = math.floor(seconds)
+            self._nanoseconds = int(whole) * _NANOS_PER_SECOND + int(round((seconds - whole) * 1e9)) + nanos
+        else:
+            self._nanoseconds = seconds * _NANOS_PER_SECOND + nanos
+
+    @classmethod
+    def from_now(cls) -> 'Timestamp':
+        return cls.from_nanoseconds(time_ns())
 
-    def __init__(self, timestamp: float):
-        self._timestamp = timestamp
+    @classmethod
+    def from_nanoseconds(cls, nanoseconds: int) -> 'Timestamp':
+        """The time `nanoseconds` after the epoch."""
+        timestamp = cls.__new__(cls)
+        timestamp._nanoseconds = nanoseconds
+        return timestamp
 
     @classmethod
-    def from_now(cls):
-        timestamp = dt.now().timestamp()
-        return cls(timestamp)
+    def from_datetime(cls, value: dt) -> 'Timestamp':
+        return cls.from_nanoseconds(datetime_nanoseconds(value))
+
+    @property
+    def nanoseconds(self) -> int:
+        """Nanoseconds since the epoch."""
+        return self._nanoseconds
 
     @property
-    def seconds(self):
-        return str(self._timestamp).split('.')[0]
+    def seconds(self) -> int:
+        return self._nanoseconds // _NANOS_PER_SECOND
 
     @property
-    def nanos(self):
-        return str(self._timestamp).split('.')[1]
+    def nanos(self) -> int:
+        # Never negative, even before the epoch, as in protobuf.
+        return self._nanoseconds % _NANOS_PER_SECOND
+
+    def to_datetime(self) -> dt:
+        """An aware UTC datetime, truncated to the microsecond."""
+        return _EPOCH + timedelta(microseconds=self._nanoseconds // 1000)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds == other._nanoseconds
+
+    def __ne__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds != other._nanoseconds
+
+    def __lt__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds < other._nanoseconds
+
+    def __le__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds <= other._nanoseconds
+
+    def __gt__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds > other._nanoseconds
+
+    def __ge__(self, other: Any) -> bool:
+        if not isinstance(other, Timestamp):
+            return NotImplemented
+        return self._nanoseconds >= other._nanoseconds
+
+    def __hash__(self) -> int:
+        return hash(self._nanoseconds)
+
+    def __repr__(self) -> str:
+        return 'Timestamp(seconds={}, nanos={})'.format(self.seconds, self.nanos)
 
 
 def get_document_iterator(document: Dict[str, Any], prefix: str = '') -> Iterator[Tuple[str, Any]]:
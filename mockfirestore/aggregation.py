@@ -0,0 +1,116 @@
+from itertools import islice
+from typing import Any, Iterator, List, Optional, Tuple  # noqa: F401
+
+from mockfirestore._helpers import Document, MISSING, Timestamp, get_field_value
+
+COUNT = 'count'
+SUM = 'sum'
+AVG = 'avg'
+
+
+class AggregationResult:
+    def __init__(self, alias: str, value: Any, read_time: Optional[Timestamp] = None) -> None:
+        self.alias = alias
+        self.value = value
+        self.read_time = read_time
+
+    def __repr__(self):
+        return '<Aggregation alias={}, value={}, readtime={}>'.format(self.alias, self.value, self.read_time)
+
+
+class AggregationQuery:
+    """
+    Aggregations over the results of a query, as returned by `Query.count`,
+    `sum` and `avg`. They are computed in one pass over the stored fields,
+    without snapshots; counting a whole collection reads its document count.
+
+    As in Firestore, `sum` and `avg` only take numeric values into account,
+    and `avg` is None when there are none.
+    """
+
+    def __init__(self, nested_query: Any) -> None:
+        self._nested_query = nested_query
+        # (kind, split field path or None, alias,)
+        self._aggregations = []  # type: List[Tuple[str, Optional[List[str]], Optional[str]]]
+
+    def count(self, alias: Optional[str] = None) -> 'AggregationQuery':
+        self._aggregations.append((COUNT, None, alias))
+        return self
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        self._aggregations.append((SUM, field_ref.split('.'), alias))
+        return self
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        self._aggregations.append((AVG, field_ref.split('.'), alias))
+        return self
+
+    def get(self, transaction=None) -> List[List[AggregationResult]]:
+        return [self._results()]
+
+    def stream(self, transaction=None) -> Iterator[List[AggregationResult]]:
+        return iter([self._results()])
+
+    def _results(self) -> List[AggregationResult]:
+        read_time = Timestamp.from_nanoseconds(self._nested_query.parent._store.read_time())
+        count = self._stored_count()
+        if count is not None:
+            values = [count] * len(self._aggregations)
+        else:
+            values = self._aggregate(self._documents())
+        return [AggregationResult(alias or 'field_{}'.format(position), value, read_time)
+                for position, ((_, _, alias), value) in enumerate(zip(self._aggregations, values), 1)]
+
+    def _stored_count(self) -> Optional[int]:
+        """The count, read from the stored document counts when nothing else is asked."""
+        query = self._nested_query
+        if any(kind != COUNT for kind, _, _ in self._aggregations):
+            return None
+        if query._field_filters or query.orders or query._start_at or query._end_at:
+            return None
+        store = query.parent._store
+        if query.all_descendants:
+            count = sum(collection.count for _, collection in store.collection_group(query.parent.id))
+        else:
+            count = store.count(query.parent._path)
+        count = max(count - (query._offset or 0), 0)
+        return min(count, query._limit) if query._limit else count
+
+    def _documents(self) -> Iterator[Document]:
+        query = self._nested_query
+        if query.orders or query._start_at or query._end_at:
+            # Ordering and cursors decide which documents are in the results.
+            return (snapshot._doc for snapshot in query._snapshots())
+        documents = query._matching_fields()
+        if query._offset:
+            documents = islice(documents, query._offset, None)
+        if query._limit:
+            documents = islice(documents, query._limit)
+        return documents
+
+    def _aggregate(self, documents: Iterator[Document]) -> List[Any]:
+        count = 0
+        totals = [0] * len(self._aggregations)
+        numbers = [0] * len(self._aggregations)
+        field_aggregations = [(position, path) for position, (kind, path, _) in enumerate(self._aggregations)
+                              if kind != COUNT]
+        for document in documents:
+            count += 1
+            for position, path in field_aggregations:
+                value = get_field_value(document, path)
+                if value is not MISSING and _is_number(value):
+                    totals[position] += value
+                    numbers[position] += 1
+        values = []
+        for (kind, _, _), total, number in zip(self._aggregations, totals, numbers):
+            if kind == COUNT:
+                values.append(count)
+            elif kind == SUM:
+                values.append(total)
+            else:
+                values.append(total / number if number else None)
+        return values
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
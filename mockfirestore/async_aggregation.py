@@ -0,0 +1,11 @@
+from typing import AsyncIterator, List
+
+from mockfirestore.aggregation import AggregationQuery, AggregationResult
+
+
+class AsyncAggregationQuery(AggregationQuery):
+    async def get(self, transaction=None) -> List[List[AggregationResult]]:
+        return [self._results()]
+
+    async def stream(self, transaction=None) -> AsyncIterator[List[AggregationResult]]:
+        yield self._results()
@@ -0,0 +1,45 @@
+from typing import AsyncIterator, Iterable
+
+from mockfirestore.async_collection import AsyncCollectionReference
+from mockfirestore.async_document import AsyncDocumentReference
+from mockfirestore.async_transaction import AsyncTransaction
+from mockfirestore.async_write_batch import AsyncWriteBatch
+from mockfirestore.client import MockFirestore
+from mockfirestore.document import DocumentSnapshot
+
+
+class AsyncMockFirestore(MockFirestore):
+    """
+    An in-memory stand-in for `google.cloud.firestore.AsyncClient`.
+
+    The data lives in memory, so nothing is ever awaited on I/O: the async
+    methods run the same code as `MockFirestore`, without thread hops.
+    """
+
+    def collection(self, path: str) -> AsyncCollectionReference:
+        if "/" not in path:
+            return AsyncCollectionReference(self._store, [path])
+        return super().collection(path)
+
+    async def collections(self) -> AsyncIterator[AsyncCollectionReference]:
+        for collection_name in self._store.collections:
+            yield AsyncCollectionReference(self._store, [collection_name])
+
+    async def get_all(
+        self,
+        references: Iterable[AsyncDocumentReference],
+        field_paths=None,
+        transaction=None,
+    ) -> AsyncIterator[DocumentSnapshot]:
+        if transaction is not None:
+            async for snapshot in await transaction.get_all(references):
+                yield snapshot
+            return
+        for snapshot in self._get_all(references, field_paths):
+            yield snapshot
+
+    def transaction(self, **kwargs) -> AsyncTransaction:
+        return AsyncTransaction(self, **kwargs)
+
+    def batch(self) -> AsyncWriteBatch:
+        return AsyncWriteBatch(self)
@@ -0,0 +1,30 @@
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from mockfirestore._helpers import Timestamp
+from mockfirestore.async_document import AsyncDocumentReference
+from mockfirestore.async_query import AsyncQuery, _yield_periodically
+from mockfirestore.collection import CollectionReference
+from mockfirestore.document import DocumentSnapshot
+
+
+class AsyncCollectionReference(CollectionReference):
+    def _document_reference(self, path: List[str], parent: Optional[CollectionReference] = None) \
+            -> AsyncDocumentReference:
+        return AsyncDocumentReference(self._store, path, parent=parent)
+
+    async def get(self) -> List[DocumentSnapshot]:
+        return [snapshot async for snapshot in self.stream()]
+
+    async def add(self, document_data: Dict, document_id: str = None) \
+            -> Tuple[Timestamp, AsyncDocumentReference]:
+        return super().add(document_data, document_id)
+
+    def _query(self, **kwargs) -> AsyncQuery:
+        return AsyncQuery(self, **kwargs)
+
+    async def list_documents(self, page_size: Optional[int] = None) -> AsyncIterator[AsyncDocumentReference]:
+        for reference in super().list_documents(page_size):
+            yield reference
+
+    def stream(self, transaction=None) -> AsyncIterator[DocumentSnapshot]:
+        return _yield_periodically(super().stream())
@@ -0,0 +1,23 @@
+from typing import Dict, Any, List, Optional
+
+from mockfirestore.document import DocumentReference, DocumentSnapshot, WriteOption
+
+
+class AsyncDocumentReference(DocumentReference):
+    async def get(self) -> DocumentSnapshot:
+        return super().get()
+
+    async def delete(self, option: Optional[WriteOption] = None):
+        self._delete(option)
+
+    async def set(self, data: Dict, merge=False, **kwargs):
+        self._set(data, merge)
+
+    async def update(self, data: Dict[str, Any], option: Optional[WriteOption] = None):
+        self._update(data, option)
+
+    def _collection_reference(self, path: List[str], parent: Optional[DocumentReference] = None) \
+            -> "AsyncCollectionReference":
+        from mockfirestore.async_collection import AsyncCollectionReference
+
+        return AsyncCollectionReference(self._store, path, parent=parent)
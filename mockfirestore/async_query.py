@@ -0,0 +1,28 @@
+import asyncio
+from typing import AsyncIterator, Iterable, List
+
+from mockfirestore.async_aggregation import AsyncAggregationQuery
+from mockfirestore.document import DocumentSnapshot
+from mockfirestore.query import Query
+
+# Snapshots streamed between two yields to the event loop.
+STREAM_BATCH_SIZE = 500
+
+
+async def _yield_periodically(snapshots: Iterable[DocumentSnapshot]) -> AsyncIterator[DocumentSnapshot]:
+    """Stream snapshots, letting other coroutines run every `STREAM_BATCH_SIZE` of them."""
+    for position, snapshot in enumerate(snapshots, 1):
+        yield snapshot
+        if position % STREAM_BATCH_SIZE == 0:
+            await asyncio.sleep(0)
+
+
+class AsyncQuery(Query):
+    def _aggregation_query(self) -> AsyncAggregationQuery:
+        return AsyncAggregationQuery(self)
+
+    def stream(self, transaction=None) -> AsyncIterator[DocumentSnapshot]:
+        return _yield_periodically(self._snapshots())
+
+    async def get(self, transaction=None) -> List[DocumentSnapshot]:
+        return [snapshot async for snapshot in self.stream(transaction)]
@@ -0,0 +1,70 @@
+from typing import AsyncIterator, Callable, Iterable, List
+
+from mockfirestore import Aborted
+from mockfirestore.async_query import _yield_periodically
+from mockfirestore.document import DocumentReference, DocumentSnapshot
+from mockfirestore.transaction import Transaction, WriteResult, _EXCEED_ATTEMPTS_TEMPLATE
+
+
+class AsyncTransaction(Transaction):
+    """
+    A `Transaction` whose reads and commit are awaited, as in
+    `google.cloud.firestore.AsyncTransaction`. Writes are buffered as before.
+    """
+
+    async def _begin(self, retry_id=None):
+        super()._begin(retry_id)
+
+    async def _rollback(self):
+        super()._rollback()
+
+    async def _commit(self) -> List[WriteResult]:
+        return super()._commit()
+
+    async def commit(self) -> List[WriteResult]:
+        return await self._commit()
+
+    async def get_all(self, references: Iterable[DocumentReference]) -> AsyncIterator[DocumentSnapshot]:
+        return _yield_periodically(super().get_all(references))
+
+    async def get(self, ref_or_query) -> AsyncIterator[DocumentSnapshot]:
+        return _yield_periodically(super().get(ref_or_query))
+
+    def __enter__(self):
+        raise TypeError('Use "async with" with an AsyncTransaction')
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # The inherited one would create a commit coroutine and drop it.
+        raise TypeError('Use "async with" with an AsyncTransaction')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.commit()
+
+
+class _AsyncTransactional:
+    """Runs a coroutine function in a transaction, retrying it when the commit conflicts."""
+    def __init__(self, to_wrap: Callable) -> None:
+        self.to_wrap = to_wrap
+
+    async def __call__(self, transaction: AsyncTransaction, *args, **kwargs):
+        for _ in range(transaction._max_attempts):
+            await transaction._begin()
+            try:
+                result = await self.to_wrap(transaction, *args, **kwargs)
+                await transaction._commit()
+                return result
+            except Aborted:
+                await transaction._rollback()
+            except BaseException:
+                await transaction._rollback()
+                raise
+        raise ValueError(_EXCEED_ATTEMPTS_TEMPLATE.format(transaction._max_attempts))
+
+
+def async_transactional(to_wrap: Callable) -> _AsyncTransactional:
+    """Decorate a coroutine function taking a transaction first, as `firestore.async_transactional`."""
+    return _AsyncTransactional(to_wrap)
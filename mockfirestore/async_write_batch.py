@@ -0,0 +1,13 @@
+from mockfirestore.write_batch import WriteBatch
+
+
+class AsyncWriteBatch(WriteBatch):
+    async def commit(self):
+        return super().commit()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            await self.commit()
@@ -0,0 +1,125 @@
+from concurrent.futures import Future, ThreadPoolExecutor  # noqa: F401
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional  # noqa: F401
+
+from mockfirestore.document import DocumentReference
+from mockfirestore.write_batch import WriteBatch
+
+
+class BulkWriter:
+    """
+    Buffers any number of writes and commits them in batches of `batch_size`
+    on a pool of `max_workers` threads.
+
+    Writes are not atomic with each other: each one that fails is reported to
+    the `on_write_error` callback, with its reference and exception, and the
+    others are still applied. Without a callback, `flush` and `close` raise
+    the first failure. Writes to the same document always go to the same
+    worker, so they are applied in the order they were made.
+    """
+
+    def __init__(self, mock_firestore, batch_size: int = 500, max_workers: int = 4) -> None:
+        if batch_size < 1 or max_workers < 1:
+            raise ValueError('batch_size and max_workers must be positive')
+        self._mock_firestore = mock_firestore
+        self._batch_size = batch_size
+        # One thread per worker keeps each worker's batches in order.
+        self._workers = [ThreadPoolExecutor(max_workers=1) for _ in range(max_workers)]
+        self._batches = [self._new_batch() for _ in range(max_workers)]
+        self._futures = []  # type: List[Future]
+        self._errors = []  # type: List[Exception]
+        self._on_write_result = None  # type: Optional[Callable[[DocumentReference, Any], None]]
+        self._on_write_error = None  # type: Optional[Callable[[DocumentReference, Exception], None]]
+        self._lock = Lock()
+        self._closed = False
+
+    def create(self, document_reference: DocumentReference, data: Dict[str, Any]):
+        self._add(document_reference, 'create', data)
+
+    def set(self, document_reference: DocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._add(document_reference, 'set', data, merge=merge)
+
+    def update(self, document_reference: DocumentReference, data: Dict[str, Any]):
+        self._add(document_reference, 'update', data)
+
+    def delete(self, document_reference: DocumentReference):
+        self._add(document_reference, 'delete')
+
+    def on_write_result(self, callback: Callable[[DocumentReference, Any], None]):
+        """Call `callback(reference, write_result)` after each successful write."""
+        self._on_write_result = callback
+
+    def on_write_error(self, callback: Callable[[DocumentReference, Exception], None]):
+        """Call `callback(reference, exception)` for each failed write, instead of raising it."""
+        self._on_write_error = callback
+
+    def flush(self):
+        """Commit every buffered write, and wait until they are all applied."""
+        with self._lock:
+            for worker in range(len(self._workers)):
+                self._submit(worker)
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            for worker in self._workers:
+                worker.shutdown()
+
+    def _add(self, document_reference: DocumentReference, operation: str, *args, **kwargs):
+        if self._closed:
+            raise ValueError('BulkWriter is closed')
+        worker = hash(tuple(document_reference._path)) % len(self._workers)
+        with self._lock:
+            batch = self._batches[worker]
+            getattr(batch, operation)(document_reference, *args, **kwargs)
+            if len(batch) >= self._batch_size:
+                self._submit(worker)
+
+    def _submit(self, worker: int):
+        batch = self._batches[worker]
+        if not len(batch):
+            return
+        self._batches[worker] = self._new_batch()
+        self._futures.append(self._workers[worker].submit(self._commit, batch))
+
+    def _commit(self, batch: WriteBatch):
+        operations = list(batch._operations)
+        try:
+            results = batch.commit()
+        except Exception:
+            # Find the writes that failed by applying them one at a time.
+            for operation in operations:
+                single = self._new_batch()
+                single._operations.append(operation)
+                self._commit_one(single, operation['ref'])
+            return
+        if self._on_write_result is not None:
+            for operation, result in zip(operations, results):
+                self._on_write_result(operation['ref'], result)
+
+    def _commit_one(self, batch: WriteBatch, reference: DocumentReference):
+        try:
+            result, = batch.commit()
+        except Exception as error:
+            if self._on_write_error is not None:
+                self._on_write_error(reference, error)
+            else:
+                with self._lock:
+                    self._errors.append(error)
+            return
+        if self._on_write_result is not None:
+            self._on_write_result(reference, result)
+
+    def _new_batch(self) -> WriteBatch:
+        return WriteBatch(self._mock_firestore)
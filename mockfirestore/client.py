@@ -1,33 +1,52 @@
-from typing import Iterable
+import json
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+from mockfirestore._helpers import generate_random_string, read_only
+from mockfirestore.bulk_writer import BulkWriter
 from mockfirestore.collection import CollectionReference
-from mockfirestore.document import DocumentReference, DocumentSnapshot
+from mockfirestore.document import (
+    DocumentReference, DocumentSnapshot, ExistsOption, LastUpdateOption, WriteOption, unique_references)
+from mockfirestore.index import HASH
+from mockfirestore.persistence import load_store, save_store
+from mockfirestore.query import Query
+from mockfirestore.store import Store
 from mockfirestore.transaction import Transaction
 from mockfirestore.write_batch import WriteBatch
 
 
 class MockFirestore:
     def __init__(self) -> None:
-        self._data = {}
-
-    def _ensure_path(self, path):
-        current_position = self
-
-        for el in path[:-1]:
-            if type(current_position) in (MockFirestore, DocumentReference):
-                current_position = current_position.collection(el)
-            else:
-                current_position = current_position.document(el)
-
-        return current_position
+        self._store = Store()
+
+    @property
+    def _data(self) -> dict:
+        """
+        A deep copy of the store in the nested-dict layout. It is read-only, so
+        that changes which would never reach the store raise TypeError.
+        """
+        return read_only(self._store.to_dict())
+
+    @_data.setter
+    def _data(self, data: dict):
+        """
+        Replace the store with a copy of a nested-dict layout, keeping declared
+        indexes. Subcollections are read as described in `Store.from_dict`.
+        """
+        store = Store.from_dict(deepcopy(data))
+        for collection_path, field_path, kind in self._store.index_definitions():
+            store.create_index(collection_path, field_path, kind)
+        self._store.restore(store)
 
     def document(self, path: str) -> DocumentReference:
         path = path.split("/")
 
         if len(path) % 2 != 0:
             raise Exception("Cannot create document at path {}".format(path))
-        current_position = self._ensure_path(path)
 
-        return current_position.document(path[-1])
+        # References build their parents on demand, so one is enough
+        # however deep the path.
+        return self.collection(path[0])._document_reference(path)
 
     def collection(self, path: str) -> CollectionReference:
         path = path.split("/")
@@ -35,21 +54,114 @@ class MockFirestore:
         if len(path) % 2 != 1:
             raise Exception("Cannot create collection at path {}".format(path))
 
-        name = path[-1]
         if len(path) > 1:
-            current_position = self._ensure_path(path)
-            return current_position.collection(name)
-        else:
-            if name not in self._data:
-                self._data[name] = {}
-            return CollectionReference(self._data, [name])
+            return self.collection(path[0])._document_reference(path[:-1]).collection(path[-1])
+        return CollectionReference(self._store, path)
+
+    def collection_group(self, collection_id: str) -> Query:
+        """A query over every collection with this ID, wherever it is nested."""
+        if "/" in collection_id:
+            raise ValueError(
+                "Collection ID {} must not contain '/'".format(collection_id)
+            )
+        return self.collection(collection_id)._query(all_descendants=True)
 
     def collections(self) -> Iterable[CollectionReference]:
-        for collection_name in self._data:
-            yield CollectionReference(self._data, [collection_name])
+        for collection_name in self._store.collections:
+            yield CollectionReference(self._store, [collection_name])
 
     def reset(self):
-        self._data = {}
+        self._store.restore(Store())
+
+    def fork(self) -> 'MockFirestore':
+        """
+        An independent client starting from this one's data and indexes.
+        Forking takes constant time; data is copied lazily, as either side
+        writes. The first write to a collection copies its map of documents
+        and its indexes, in time proportional to the collection's size.
+        """
+        client = type(self)()
+        client._store = self._store.fork()
+        return client
+
+    def snapshot(self) -> Store:
+        """
+        Capture the current state in constant time, for a later `restore`.
+        As after `fork`, the next write to each collection copies it first.
+        """
+        return self._store.fork()
+
+    def restore(self, snapshot: Store):
+        """
+        Go back to a state captured by `snapshot`. The snapshot itself is left
+        untouched, so it can be restored any number of times. References and
+        listeners made before the restore see the restored state.
+        """
+        self._store.restore(snapshot)
+
+    def save(self, path: str):
+        """
+        Write every document, subcollection and declared index to a binary
+        file, for a later `load`. Field values are pickled, so any value a
+        document can hold, such as timestamps, is kept.
+        """
+        save_store(self._store, path)
+
+    def load(self, path: str, lazy: bool = False):
+        """
+        Replace the data and indexes with those saved in a file by `save`. With
+        `lazy`, the file is memory-mapped and each document is only decoded
+        when first read. Files are pickles: only load files you trust.
+        """
+        self._store.restore(load_store(path, lazy))
+
+    def create_index(self, collection_path: str, field_path: str, kind: str = HASH):
+        """
+        Declare a secondary index on a field of the collection at this path.
+
+        `kind` is `'hash'` (answers `==` and `in`), `'sorted'` (answers `<`,
+        `<=`, `>` and `>=`) or `'array'` (answers `array_contains` and
+        `array_contains_any`). Queries use matching indexes automatically.
+        """
+        self._store.create_index(collection_path.split("/"), field_path, kind)
+
+    def drop_index(self, collection_path: str, field_path: str, kind: str = HASH):
+        self._store.drop_index(collection_path.split("/"), field_path, kind)
+
+    def bulk_load(self, collection_path: str, documents: Iterable[Tuple[str, dict]]) -> int:
+        """
+        Store `(document ID, data)` pairs in the collection at this path, as
+        `set` would, straight into storage. Indexes on the collection are
+        updated once at the end. The data is not copied: do not modify it
+        afterwards.
+
+        :returns: the number of documents loaded.
+        """
+        path = collection_path.split("/")
+        if len(path) % 2 != 1:
+            raise Exception("Cannot create collection at path {}".format(path))
+        return self._store.bulk_load(path, documents)
+
+    def load_ndjson(self, collection_path: str, file: Union[str, IO[str]], id_field: str = 'id') -> int:
+        """
+        Bulk load a file holding one JSON document per line, read as it is
+        loaded. As for `CollectionReference.add`, the document ID is read from
+        `id_field`, and generated when it is missing.
+        """
+        with _open(file) as lines:
+            documents = (json.loads(line) for line in lines if line.strip())
+            return self.bulk_load(collection_path, _with_ids(documents, id_field))
+
+    def load_json(self, collection_path: str, file: Union[str, IO[str]], id_field: str = 'id') -> int:
+        """
+        Bulk load a JSON file holding either an object of documents by ID, or
+        an array of documents with their ID in `id_field`, as `load_ndjson`.
+        """
+        with _open(file) as content:
+            documents = json.load(content)
+        if isinstance(documents, dict):
+            return self.bulk_load(collection_path, documents.items())
+        return self.bulk_load(collection_path, _with_ids(documents, id_field))
 
     def get_all(
         self,
@@ -57,8 +169,24 @@ class MockFirestore:
         field_paths=None,
         transaction=None,
     ) -> Iterable[DocumentSnapshot]:
-        for doc_ref in set(references):
-            yield doc_ref.get()
+        if transaction is not None:
+            yield from transaction.get_all(references)
+            return
+        yield from self._get_all(references, field_paths)
+
+    def _get_all(self, references: Iterable[DocumentReference],
+                 field_paths: Optional[Iterable[str]] = None) -> List[DocumentSnapshot]:
+        """
+        Snapshots of the documents, each read once, in the order they were
+        first referenced, and projected on `field_paths` when given.
+        """
+        references = unique_references(references)
+        if field_paths is not None:
+            field_paths = [field_path.split('.') for field_path in field_paths]
+        documents = self._store.get_all_fields(references)
+        read_time = self._store.read_time()
+        return [DocumentSnapshot(reference, fields, field_paths, created, version, read_time)
+                for reference, (version, created, fields) in zip(references.values(), documents)]
 
     def transaction(self, **kwargs) -> Transaction:
         return Transaction(self, **kwargs)
@@ -66,6 +194,40 @@ class MockFirestore:
     def batch(self) -> WriteBatch:
         return WriteBatch(self)
 
+    def bulk_writer(self, batch_size: int = 500, max_workers: int = 4) -> BulkWriter:
+        return BulkWriter(self, batch_size=batch_size, max_workers=max_workers)
+
+    @staticmethod
+    def write_option(**kwargs) -> WriteOption:
+        """
+        A precondition for `update` and `delete`: either
+        `last_update_time=snapshot.update_time` or `exists=True|False`.
+        """
+        if len(kwargs) != 1:
+            raise TypeError('Exactly one write option must be given, not {}'.format(sorted(kwargs)))
+        name, value = kwargs.popitem()
+        if name == 'last_update_time':
+            return LastUpdateOption(value)
+        if name == 'exists':
+            return ExistsOption(value)
+        raise TypeError('Unknown write option: {}'.format(name))
+
     @classmethod
     def batch_commit(cls, batch: WriteBatch):
         batch.commit()
+
+
+@contextmanager
+def _open(file: Union[str, IO[str]]) -> Iterator[IO[str]]:
+    """Open a file by path, or use an already open one without closing it."""
+    if isinstance(file, str):
+        with open(file, encoding='utf-8') as opened:
+            yield opened
+    else:
+        yield file
+
+
+def _with_ids(documents: Iterable[dict], id_field: str) -> Iterator[Tuple[str, dict]]:
+    for document in documents:
+        # Document IDs are strings, even when JSON holds them as numbers.
+        yield str(document.get(id_field, generate_random_string())), document
@@ -1,31 +1,39 @@
 import warnings
-from typing import Any, List, Optional, Iterable, Dict, Tuple, Sequence, Union
+from typing import Any, Callable, List, Optional, Iterable, Dict, Tuple, Sequence, Union
 
 from mockfirestore import AlreadyExists
-from mockfirestore._helpers import generate_random_string, Store, get_by_path, set_by_path, Timestamp
+from mockfirestore._helpers import generate_random_string, Timestamp
 from mockfirestore.query import Query
 from mockfirestore.document import DocumentReference, DocumentSnapshot
+from mockfirestore.store import Store
 
 
 class CollectionReference:
-    def __init__(self, data: Store, path: List[str],
+    def __init__(self, store: Store, path: List[str],
                  parent: Optional[DocumentReference] = None) -> None:
-        self._data = data
+        self._store = store
         self._path = path
-        self.parent = parent
+        self._parent = parent
 
     @property
     def id(self) -> str:
         return self._path[-1]
 
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        # Built on first use, so a deep reference does not need its ancestors.
+        if self._parent is None and len(self._path) > 1:
+            self._parent = self._document_reference(self._path[:-1])
+        return self._parent
+
     def document(self, document_id: Optional[str] = None) -> DocumentReference:
-        collection = get_by_path(self._data, self._path)
         if document_id is None:
             document_id = generate_random_string()
-        new_path = self._path + [document_id]
-        if document_id not in collection:
-            set_by_path(self._data, new_path, {})
-        return DocumentReference(self._data, new_path, parent=self)
+        return self._document_reference(self._path + [document_id], parent=self)
+
+    def _document_reference(self, path: List[str], parent: Optional['CollectionReference'] = None) \
+            -> DocumentReference:
+        return DocumentReference(self._store, path, parent=parent)
 
     def get(self) -> Iterable[DocumentSnapshot]:
         warnings.warn('Collection.get is deprecated, please use Collection.stream',
@@ -36,68 +44,87 @@ class CollectionReference:
             -> Tuple[Timestamp, DocumentReference]:
         if document_id is None:
             document_id = document_data.get('id', generate_random_string())
-        collection = get_by_path(self._data, self._path)
         new_path = self._path + [document_id]
-        if document_id in collection:
+        if self._store.get_fields(new_path):
             raise AlreadyExists('Document already exists: {}'.format(new_path))
-        doc_ref = DocumentReference(self._data, new_path, parent=self)
-        doc_ref.set(document_data)
-        timestamp = Timestamp.from_now()
+        doc_ref = self.document(document_id)
+        timestamp = Timestamp.from_nanoseconds(doc_ref._set(document_data))
         return timestamp, doc_ref
 
     def where(self, field: Optional[str] = None, op: Optional[str] = None,
               value: Optional[Any] = None, filter: Optional[Any] = None) -> Query:
-        if filter is not None:
-            # Assuming filter is an object with field_path, op_string, and value attributes
-            # similar to google.cloud.firestore_v1.base_query.FieldFilter
-            field_path = filter.field_path
-            op_string = filter.op_string
-            val = filter.value
-        elif field is not None and op is not None and value is not None:
-            field_path = field
-            op_string = op
-            val = value
-        else:
-            raise ValueError("Either 'filter' or all of 'field', 'op', and 'value' must be provided.")
-
-        query = Query(self, field_filters=[(field_path, op_string, val)])
+        return self._query().where(field, op, value, filter=filter)
+
+    def select(self, field_paths: Iterable[str]) -> Query:
+        query = self._query(projection=list(field_paths))
         return query
 
     def order_by(self, key: str, direction: Optional[str] = None) -> Query:
-        query = Query(self, orders=[(key, direction)])
+        query = self._query(orders=[(key, direction)])
         return query
 
     def limit(self, limit_amount: int) -> Query:
-        query = Query(self, limit=limit_amount)
+        query = self._query(limit=limit_amount)
         return query
 
     def offset(self, offset: int) -> Query:
-        query = Query(self, offset=offset)
+        query = self._query(offset=offset)
         return query
 
     def start_at(self, document_fields_or_snapshot: Union[dict, DocumentSnapshot]) -> Query:
-        query = Query(self, start_at=(document_fields_or_snapshot, True))
+        query = self._query(start_at=(document_fields_or_snapshot, True))
         return query
 
     def start_after(self, document_fields_or_snapshot: Union[dict, DocumentSnapshot]) -> Query:
-        query = Query(self, start_at=(document_fields_or_snapshot, False))
+        query = self._query(start_at=(document_fields_or_snapshot, False))
         return query
 
     def end_at(self, document_fields_or_snapshot: Union[dict, DocumentSnapshot]) -> Query:
-        query = Query(self, end_at=(document_fields_or_snapshot, True))
+        query = self._query(end_at=(document_fields_or_snapshot, True))
         return query
 
     def end_before(self, document_fields_or_snapshot: Union[dict, DocumentSnapshot]) -> Query:
-        query = Query(self, end_at=(document_fields_or_snapshot, False))
+        query = self._query(end_at=(document_fields_or_snapshot, False))
         return query
 
+    def _query(self, **kwargs) -> Query:
+        return Query(self, **kwargs)
+
+    def count(self, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._query().count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._query().sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._query().avg(field_ref, alias)
+
+    def on_snapshot(self, callback: Callable) -> 'Watch':
+        return self._query().on_snapshot(callback)
+
     def list_documents(self, page_size: Optional[int] = None) -> Sequence[DocumentReference]:
-        docs = []
-        for key in get_by_path(self._data, self._path):
-            docs.append(self.document(key))
-        return docs
+        collection = self._store.get_collection(self._path)
+        if collection is None:
+            return []
+        return [self.document(key) for key in collection.documents]
 
     def stream(self, transaction=None) -> Iterable[DocumentSnapshot]:
-        for key in sorted(get_by_path(self._data, self._path)):
-            doc_snapshot = self.document(key).get()
-            yield doc_snapshot
+        collection = self._store.get_collection(self._path)
+        if collection is None:
+            return
+        read_time = self._store.read_time()
+        for key in collection.iter_ids():
+            document = collection.documents.get(key)
+            if document is None:
+                continue
+            version = document.version
+            created = document.created
+            fields = document.fields
+            if fields:
+                yield DocumentSnapshot(self.document(key), fields, None, created, version, read_time)
+
+
+def get_collection_reference(store: Store, path: List[str],
+                             collection_class: type = CollectionReference) -> CollectionReference:
+    """A reference to the collection at this path; its parents are built when asked for."""
+    return collection_class(store, path)
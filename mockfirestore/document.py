@@ -1,23 +1,41 @@
+from collections import OrderedDict
 from copy import deepcopy
 from functools import reduce
 import operator
-from typing import List, Dict, Any
-from mockfirestore import NotFound
+from typing import Callable, List, Dict, Any, Iterable, Optional, Sequence, Tuple
+from mockfirestore import FailedPrecondition, NotFound
 from mockfirestore._helpers import (
     Timestamp,
     Document,
-    Store,
     get_by_path,
     set_by_path,
-    delete_by_path,
     get_document_iterator,
+    project_fields,
 )
+from mockfirestore.store import Store
 
 
 class DocumentSnapshot:
-    def __init__(self, reference: "DocumentReference", data: Document) -> None:
+    """
+    A document as it was read. Times are kept as integer nanoseconds since
+    the epoch, 0 when unknown, and only made into `Timestamp`s when asked for.
+    """
+
+    def __init__(self, reference: "DocumentReference", data: Document,
+                 field_paths: Optional[Sequence[Sequence[str]]] = None,
+                 create_time: int = 0, update_time: int = 0, read_time: int = 0) -> None:
         self.reference = reference
-        self._doc = deepcopy(data)
+        # Stored fields are never mutated in place: every write swaps in a new
+        # dict. Holding on to them is therefore a stable read-only view, and
+        # the copy is deferred until the caller asks for a mutable dict.
+        self._doc = data
+        # Split field paths of a query's projection, or None for every field.
+        self._field_paths = field_paths
+        self._dict = None
+        self._copied = False
+        self._create_time = create_time
+        self._update_time = update_time
+        self._read_time = read_time
 
     @property
     def id(self):
@@ -25,86 +43,224 @@ class DocumentSnapshot:
 
     @property
     def exists(self) -> bool:
-        return self._doc != {}
+        return bool(self._doc)
 
     def to_dict(self) -> Document:
-        return self._doc
+        if not self._copied:
+            if self._field_paths is None or not self._doc:
+                self._dict = deepcopy(self._doc)
+            else:
+                self._dict = project_fields(self._doc, self._field_paths)
+            self._copied = True
+        return self._dict
 
     @property
-    def create_time(self) -> Timestamp:
-        timestamp = Timestamp.from_now()
-        return timestamp
+    def create_time(self) -> Optional[Timestamp]:
+        """When the document was created, or None if it does not exist."""
+        if not self.exists or not self._create_time:
+            return None
+        return Timestamp.from_nanoseconds(self._create_time)
 
     @property
-    def update_time(self) -> Timestamp:
-        return self.create_time
+    def update_time(self) -> Optional[Timestamp]:
+        """When the document was last written, or None if it does not exist."""
+        if not self.exists or not self._update_time:
+            return None
+        return Timestamp.from_nanoseconds(self._update_time)
 
     @property
     def read_time(self) -> Timestamp:
-        timestamp = Timestamp.from_now()
-        return timestamp
+        if not self._read_time:
+            return Timestamp.from_now()
+        return Timestamp.from_nanoseconds(self._read_time)
 
     def get(self, field_path: str) -> Any:
         if not self.exists:
             return None
+        elif self._field_paths is not None:
+            return deepcopy(reduce(operator.getitem, field_path.split("."), self.to_dict()))
         else:
-            return reduce(operator.getitem, field_path.split("."), self._doc)
-
-    def _get_by_field_path(self, field_path: str) -> Any:
-        try:
-            return self.get(field_path)
-        except KeyError:
-            return None
+            return deepcopy(reduce(operator.getitem, field_path.split("."), self._doc))
 
 
 class DocumentReference:
     def __init__(
-        self, data: Store, path: List[str], parent: "CollectionReference"
+        self, store: Store, path: List[str], parent: Optional["CollectionReference"] = None
     ) -> None:
-        self._data = data
+        self._store = store
         self._path = path
-        self.parent = parent
+        self._parent = parent
 
     @property
     def id(self):
         return self._path[-1]
 
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DocumentReference):
+            return NotImplemented
+        return self._store is other._store and self._path == other._path
+
+    def __hash__(self) -> int:
+        return hash(tuple(self._path))
+
+    @property
+    def parent(self) -> "CollectionReference":
+        # Built on first use, so a deep reference does not need its ancestors.
+        if self._parent is None:
+            self._parent = self._collection_reference(self._path[:-1])
+        return self._parent
+
     def get(self) -> DocumentSnapshot:
-        return DocumentSnapshot(self, get_by_path(self._data, self._path))
+        return self._snapshot(*self._store.get_versioned_fields(self._path))
 
-    def delete(self):
-        delete_by_path(self._data, self._path)
+    def delete(self, option: Optional["WriteOption"] = None):
+        self._delete(option)
 
     def set(self, data: Dict, merge=False, **kwargs):
+        self._set(data, merge)
+
+    def update(self, data: Dict[str, Any], option: Optional["WriteOption"] = None):
+        self._update(data, option)
+
+    def _snapshot(self, version: int, created: int, fields: Optional[Document]) -> DocumentSnapshot:
+        return DocumentSnapshot(self, fields, None, created, version, self._store.read_time())
+
+    # The writes themselves, shared with transactions and the async client,
+    # which override the public methods.
+
+    def _delete(self, option: Optional["WriteOption"] = None):
+        if option is None:
+            self._store.delete_document(self._path)
+            return
+        with self._store.locked([self._path]):
+            version, _, document = self._store.get_versioned_fields(self._path)
+            option.check(version, document, self._path)
+            self._store.delete_document(self._path)
+
+    def _set(self, data: Dict, merge=False) -> int:
+        """:returns: the time of the write, in nanoseconds."""
         if merge:
-            try:
-                self.update(deepcopy(data))
-            except NotFound:
-                self.set(data)
-        else:
-            set_by_path(self._data, self._path, deepcopy(data))
+            with self._store.locked([self._path]):
+                fields = _written_fields(self._store.get_fields(self._path), data, merge)
+                return self._store.set_fields(self._path, fields)
+        return self._store.set_fields(self._path, deepcopy(data))
 
-    def update(self, data: Dict[str, Any]):
-        document = get_by_path(self._data, self._path)
-        if document == {}:
-            raise NotFound("No document to update: {}".format(self._path))
+    def _update(self, data: Dict[str, Any], option: Optional["WriteOption"] = None):
+        # Hold the document's lock so that concurrent increments add up.
+        with self._store.locked([self._path]):
+            version, _, document = self._store.get_versioned_fields(self._path)
+            if option is not None:
+                option.check(version, document, self._path)
+            self._store.set_fields(self._path, _updated_fields(document, data, self._path))
 
-        _apply_transformations(document, deepcopy(data))
+    def on_snapshot(self, callback: Callable) -> "Watch":
+        """
+        Call `callback([snapshot], changes, read_time)` with the document now
+        and after every write to it; the list is empty while it does not exist.
+        """
+        from mockfirestore.watch import Watch
+
+        return Watch(self._store, callback, document=self)
 
     def collection(self, name) -> "CollectionReference":
+        return self._collection_reference(self._path + [name], parent=self)
+
+    def _collection_reference(self, path: List[str], parent: Optional["DocumentReference"] = None) \
+            -> "CollectionReference":
         from mockfirestore.collection import CollectionReference
 
-        document = get_by_path(self._data, self._path)
-        new_path = self._path + [name]
-        if name not in document:
-            set_by_path(self._data, new_path, {})
-        return CollectionReference(self._data, new_path, parent=self)
+        return CollectionReference(self._store, path, parent=parent)
+
+
+class WriteOption:
+    """A precondition on a write, made by `MockFirestore.write_option`."""
+
+    def check(self, version: int, document: Optional[Document], path: Sequence[str]):
+        """:raises: FailedPrecondition unless a document at `version` holding `document` passes."""
+        raise NotImplementedError
+
+
+class LastUpdateOption(WriteOption):
+    """Only write a document last written at exactly `last_update_time`."""
+
+    def __init__(self, last_update_time: Timestamp) -> None:
+        self._last_update_time = last_update_time
+
+    def check(self, version: int, document: Optional[Document], path: Sequence[str]):
+        if not document or version != self._last_update_time.nanoseconds:
+            raise FailedPrecondition("Document was written since its last update time: {}".format(list(path)))
+
+
+class ExistsOption(WriteOption):
+    """Only write a document that exists, or that does not."""
+
+    def __init__(self, exists: bool) -> None:
+        self._exists = exists
+
+    def check(self, version: int, document: Optional[Document], path: Sequence[str]):
+        if bool(document) != self._exists:
+            raise FailedPrecondition("Document {}: {}".format(
+                "does not exist" if self._exists else "already exists", list(path)))
+
+
+def unique_references(references: Iterable[DocumentReference]) -> "OrderedDict[Tuple[str, ...], DocumentReference]":
+    """The references by path, without repeats of the same document, in first-seen order."""
+    unique = OrderedDict()  # type: OrderedDict[Tuple[str, ...], DocumentReference]
+    for reference in references:
+        unique.setdefault(tuple(reference._path), reference)
+    return unique
+
+
+def _written_fields(document: Optional[Document], data: Dict[str, Any], merge: bool = False) -> Document:
+    """
+    The fields a `set` of `data` leaves on a document holding `document`.
+    Merging combines nested maps key by key, as Firestore does.
+    """
+    if not merge or not document:
+        return deepcopy(data)
+    document = dict(document)
+    data = deepcopy(data)
+    _resolve_transformations(document, data)
+    _merge_maps(document, data)
+    return document
+
+
+def _updated_fields(document: Optional[Document], data: Dict[str, Any], path: Sequence[str]) -> Document:
+    """The fields an `update` of `data` leaves on a document holding `document`."""
+    if not document:
+        raise NotFound("No document to update: {}".format(path))
+    document = dict(document)
+    _apply_transformations(document, deepcopy(data))
+    return document
+
+
+def _merge_maps(document: Dict[str, Any], data: Dict[str, Any]):
+    """Merge `data` into `document`, copying rather than modifying nested maps."""
+    for key, value in data.items():
+        current = document.get(key)
+        if isinstance(value, dict) and value and isinstance(current, dict):
+            current = dict(current)
+            _merge_maps(current, value)
+            value = current
+        document[key] = value
 
 
 def _apply_transformations(document: Dict[str, Any], data: Dict[str, Any]):
-    """Handles special fields like INCREMENT."""
+    """
+    Handles special fields like INCREMENT.
+
+    Only the top level of `document` is modified, so a shallow copy of stored
+    fields is enough to leave existing snapshots untouched.
+    """
+    _resolve_transformations(document, data)
+    document.update(data)
+
+
+def _resolve_transformations(document: Dict[str, Any], data: Dict[str, Any]):
+    """Replace transforms in `data` with the values they give on `document`."""
     increments = {}
     arr_unions = {}
+    arr_removes = {}
 
     for key, value in get_document_iterator(data):
         if not value.__class__.__module__.startswith("google.cloud.firestore"):
@@ -125,6 +281,8 @@ def _apply_transformations(document: Dict[str, Any], data: Dict[str, Any]):
             increments[key] = value.value
         elif transformer == "ArrayUnion":
             arr_unions[key] = value.values
+        elif transformer == "ArrayRemove":
+            arr_removes[key] = value.values
 
         # All other transformations can be applied as needed.
         # See #29 for tracking.
@@ -143,4 +301,12 @@ def _apply_transformations(document: Dict[str, Any], data: Dict[str, Any]):
     _update_data(increments, 0)
     _update_data(arr_unions, [])
 
-    document.update(data)
+    for key, values in arr_removes.items():
+        path = key.split(".")
+        try:
+            item = get_by_path(document, path)
+        except (TypeError, KeyError):
+            item = []
+        # Every instance of each value goes; anything but an array becomes empty.
+        remaining = [element for element in item if element not in values] if isinstance(item, list) else []
+        set_by_path(data, path, remaining)
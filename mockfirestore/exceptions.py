@@ -9,6 +9,14 @@ class ClientError(Exception):
         return "{} {}".format(self.code, self.message)
 
 
+class BadRequest(ClientError):
+    code = 400
+
+
+class FailedPrecondition(BadRequest):
+    pass
+
+
 class Conflict(ClientError):
     code = 409
 
@@ -19,3 +27,7 @@ class NotFound(ClientError):
 
 class AlreadyExists(Conflict):
     pass
+
+
+class Aborted(Conflict):
+    pass
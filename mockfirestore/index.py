@@ -0,0 +1,359 @@
+from bisect import bisect_left, bisect_right, insort
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from mockfirestore._helpers import (
+    MISSING, Document, get_equality_key, get_field_value, get_sort_key, get_type_order)
+
+HASH = 'hash'
+SORTED = 'sorted'
+ARRAY = 'array'
+
+# Value types that can be kept in a sorted index: null, booleans, numbers,
+# timestamps, strings and bytes.
+_SORTABLE_TYPE_ORDERS = frozenset(range(6))
+
+
+class _Max:
+    """Compares greater than any document ID."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+_MAX = _Max()
+
+
+class _Index:
+    """
+    Pickles an index without its lock, so that saved stores keep their
+    contents. Copies share their sets of IDs until either side writes to one:
+    `_owned` holds the keys of the sets this index may modify.
+    """
+
+    def _ids(self, buckets: Dict[Any, Set[str]], key: Any) -> Set[str]:
+        """The IDs under `key`, made this index's own so they may be modified."""
+        ids = buckets.get(key)
+        if ids is None or key not in self._owned:
+            ids = buckets[key] = set() if ids is None else set(ids)
+            self._owned.add(key)
+        return ids
+
+    def _remove_id(self, buckets: Dict[Any, Set[str]], key: Any, doc_id: str):
+        ids = self._ids(buckets, key)
+        ids.discard(doc_id)
+        if not ids:
+            del buckets[key]
+            self._owned.discard(key)
+
+    def __getstate__(self) -> dict:
+        with self._lock:
+            state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+
+class HashIndex(_Index):
+    """
+    Maps field values to document IDs; answers `==` and `in` filters. Values
+    are keyed by `get_equality_key`, so `True` and `1` stay apart.
+
+    Indexes lock themselves, so writes to different documents of a
+    collection can maintain them from several threads.
+    """
+    kind = HASH
+    operators = ('==', 'in')
+
+    def __init__(self, field_path: str) -> None:
+        self.field_path = field_path
+        self._path = field_path.split('.')
+        self._ids_by_value = {}  # type: Dict[Tuple[int, Any], Set[str]]
+        self._value_by_id = {}  # type: Dict[str, Tuple[int, Any]]
+        self._owned = set()
+        self._lock = Lock()
+
+    def copy(self) -> 'HashIndex':
+        index = HashIndex(self.field_path)
+        with self._lock:
+            index._ids_by_value = dict(self._ids_by_value)
+            index._value_by_id = dict(self._value_by_id)
+            self._owned = set()
+        return index
+
+    def update(self, doc_id: str, document: Optional[Document]):
+        value = get_field_value(document, self._path) if document else MISSING
+        with self._lock:
+            self._discard(doc_id)
+            if value is MISSING:
+                return
+            key = get_equality_key(value)
+            try:
+                self._ids(self._ids_by_value, key).add(doc_id)
+            except TypeError:
+                # Values of unknown types may not hash; they never equal a
+                # value that does, and unhashable operands fall back to a scan.
+                return
+            self._value_by_id[doc_id] = key
+
+    def update_many(self, documents: Iterable[Tuple[str, Optional[Document]]]):
+        for doc_id, document in documents:
+            self.update(doc_id, document)
+
+    def discard(self, doc_id: str):
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id: str):
+        if doc_id not in self._value_by_id:
+            return
+        self._remove_id(self._ids_by_value, self._value_by_id.pop(doc_id), doc_id)
+
+    def lookup(self, op: str, value: Any) -> Optional[Set[str]]:
+        try:
+            with self._lock:
+                if op == '==':
+                    return set(self._ids_by_value.get(get_equality_key(value), ()))
+                if op == 'in':
+                    # The operand is already a collection of equality keys.
+                    ids = set()
+                    for key in value:
+                        ids.update(self._ids_by_value.get(key, ()))
+                    return ids
+        except TypeError:
+            return None
+        return None
+
+
+class ArrayIndex(_Index):
+    """
+    Maps the elements of array fields to the IDs of the documents holding
+    them; answers `array_contains` and `array_contains_any` filters. Elements
+    are keyed by `get_equality_key`, as in hash indexes.
+    """
+    kind = ARRAY
+    operators = ('array_contains', 'array_contains_any')
+
+    def __init__(self, field_path: str) -> None:
+        self.field_path = field_path
+        self._path = field_path.split('.')
+        self._ids_by_element = {}  # type: Dict[Tuple[int, Any], Set[str]]
+        self._elements_by_id = {}  # type: Dict[str, Set[Tuple[int, Any]]]
+        self._owned = set()
+        self._lock = Lock()
+
+    def copy(self) -> 'ArrayIndex':
+        index = ArrayIndex(self.field_path)
+        with self._lock:
+            index._ids_by_element = dict(self._ids_by_element)
+            index._elements_by_id = dict(self._elements_by_id)
+            self._owned = set()
+        return index
+
+    def update(self, doc_id: str, document: Optional[Document]):
+        value = get_field_value(document, self._path) if document else MISSING
+        with self._lock:
+            self._discard(doc_id)
+            if not isinstance(value, list):
+                return
+            elements = set()
+            for element in value:
+                key = get_equality_key(element)
+                try:
+                    self._ids(self._ids_by_element, key).add(doc_id)
+                except TypeError:
+                    # As for hash indexes, unhashable elements never match.
+                    continue
+                elements.add(key)
+            if elements:
+                self._elements_by_id[doc_id] = elements
+
+    def update_many(self, documents: Iterable[Tuple[str, Optional[Document]]]):
+        for doc_id, document in documents:
+            self.update(doc_id, document)
+
+    def discard(self, doc_id: str):
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id: str):
+        for element in self._elements_by_id.pop(doc_id, ()):
+            self._remove_id(self._ids_by_element, element, doc_id)
+
+    def lookup(self, op: str, value: Any) -> Optional[Set[str]]:
+        try:
+            with self._lock:
+                if op == 'array_contains':
+                    return set(self._ids_by_element.get(get_equality_key(value), ()))
+                if op == 'array_contains_any':
+                    ids = set()
+                    for key in value:
+                        ids.update(self._ids_by_element.get(key, ()))
+                    return ids
+        except TypeError:
+            return None
+        return None
+
+
+class SortedIndex(_Index):
+    """Keeps document IDs ordered by field value; answers range filters.
+
+    Values are bucketed by Firestore type order, so a range filter only
+    ever matches values of the same type as its operand. Within a bucket,
+    entries are `(sort key, document ID)` pairs, which is also the order
+    of a query sorted on this field.
+    """
+    kind = SORTED
+    operators = ('<', '<=', '>', '>=')
+
+    def __init__(self, field_path: str) -> None:
+        self.field_path = field_path
+        self._path = field_path.split('.')
+        self._buckets = {}  # type: Dict[int, List[Tuple[Any, str]]]
+        self._key_by_id = {}  # type: Dict[str, Tuple[int, Any]]
+        # Documents whose value has a type this index cannot order.
+        self._unsorted_ids = set()  # type: Set[str]
+        self._lock = Lock()
+
+    def copy(self) -> 'SortedIndex':
+        index = SortedIndex(self.field_path)
+        with self._lock:
+            index._buckets = {type_order: list(bucket) for type_order, bucket in self._buckets.items()}
+            index._key_by_id = dict(self._key_by_id)
+            index._unsorted_ids = set(self._unsorted_ids)
+        return index
+
+    @property
+    def complete(self) -> bool:
+        """Whether every document holding the field is in the index."""
+        return not self._unsorted_ids
+
+    @staticmethod
+    def can_order(value: Any) -> bool:
+        return get_type_order(value) in _SORTABLE_TYPE_ORDERS
+
+    def update(self, doc_id: str, document: Optional[Document]):
+        value = get_field_value(document, self._path) if document else MISSING
+        type_order, key = get_sort_key(value) if value is not MISSING else (None, None)
+        with self._lock:
+            self._discard(doc_id)
+            if value is MISSING:
+                return
+            if type_order not in _SORTABLE_TYPE_ORDERS:
+                self._unsorted_ids.add(doc_id)
+                return
+            insort(self._buckets.setdefault(type_order, []), (key, doc_id))
+            self._key_by_id[doc_id] = (type_order, key)
+
+    def update_many(self, documents: Iterable[Tuple[str, Optional[Document]]]):
+        """Like `update` for each document, but sorting each bucket once rather than per insert."""
+        values = {}  # type: Dict[str, Any]
+        for doc_id, document in documents:
+            values[doc_id] = get_field_value(document, self._path) if document else MISSING
+        with self._lock:
+            # Buckets are only sorted again at the end, so nothing may be
+            # bisected once entries are appended.
+            for doc_id in values:
+                self._discard(doc_id)
+            touched = set()
+            for doc_id, value in values.items():
+                if value is MISSING:
+                    continue
+                type_order, key = get_sort_key(value)
+                if type_order not in _SORTABLE_TYPE_ORDERS:
+                    self._unsorted_ids.add(doc_id)
+                    continue
+                self._buckets.setdefault(type_order, []).append((key, doc_id))
+                self._key_by_id[doc_id] = (type_order, key)
+                touched.add(type_order)
+            for type_order in touched:
+                self._buckets[type_order].sort()
+
+    def discard(self, doc_id: str):
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id: str):
+        self._unsorted_ids.discard(doc_id)
+        if doc_id not in self._key_by_id:
+            return
+        type_order, key = self._key_by_id.pop(doc_id)
+        bucket = self._buckets[type_order]
+        del bucket[bisect_left(bucket, (key, doc_id))]
+
+    def lookup(self, op: str, value: Any) -> Optional[Set[str]]:
+        if op not in self.operators:
+            return None
+        type_order, key = get_sort_key(value)
+        if type_order not in _SORTABLE_TYPE_ORDERS:
+            return None
+        with self._lock:
+            bucket = self._buckets.get(type_order, [])
+            if op == '<':
+                start, end = self._first_comparable(type_order, bucket), bisect_left(bucket, (key,))
+            elif op == '<=':
+                start, end = self._first_comparable(type_order, bucket), bisect_left(bucket, (key, _MAX))
+            elif op == '>':
+                start, end = bisect_left(bucket, (key, _MAX)), len(bucket)
+            else:
+                start, end = bisect_left(bucket, (key,)), len(bucket)
+            entries = bucket[start:end]
+        return {doc_id for _, doc_id in entries}
+
+    def scan(self, lower: Optional[tuple] = None, upper: Optional[tuple] = None,
+             reverse: bool = False) -> Iterator[str]:
+        """
+        Yield document IDs in `(value, ID)` order, or the reverse.
+
+        Bounds are `(value, document ID or None, inclusive)`; a bound without
+        a document ID covers every document holding that value. The range is
+        copied when the scan starts, so later writes do not shift it.
+        """
+        with self._lock:
+            lower_position = self._position(lower, upper=False) if lower else None
+            upper_position = self._position(upper, upper=True) if upper else None
+            ranges = []
+            for type_order in sorted(self._buckets, reverse=reverse):
+                bucket = self._buckets[type_order]
+                start, end = 0, len(bucket)
+                if lower_position:
+                    if type_order < lower_position[0]:
+                        continue
+                    if type_order == lower_position[0]:
+                        start = lower_position[1]
+                if upper_position:
+                    if type_order > upper_position[0]:
+                        continue
+                    if type_order == upper_position[0]:
+                        end = upper_position[1]
+                ranges.append(bucket[start:end])
+        for entries in ranges:
+            for _, doc_id in (reversed(entries) if reverse else entries):
+                yield doc_id
+
+    def _position(self, bound: tuple, upper: bool) -> Tuple[int, int]:
+        """:returns: (type order, position in that bucket,) where the bound falls."""
+        value, doc_id, inclusive = bound
+        type_order, key = get_sort_key(value)
+        bucket = self._buckets.get(type_order, [])
+        if doc_id is None:
+            # Every entry holding the value, whatever its document ID.
+            after_value = upper == inclusive
+            return type_order, bisect_left(bucket, (key, _MAX) if after_value else (key,))
+        if upper == inclusive:
+            return type_order, bisect_right(bucket, (key, doc_id))
+        return type_order, bisect_left(bucket, (key, doc_id))
+
+    @staticmethod
+    def _first_comparable(type_order: int, bucket: List[Tuple[Any, str]]) -> int:
+        # NaN sorts before all numbers, but no range filter matches it.
+        return bisect_left(bucket, ((1,),)) if type_order == 2 else 0
+
+
+INDEX_TYPES = {index_type.kind: index_type for index_type in (HashIndex, SortedIndex, ArrayIndex)}
@@ -0,0 +1,182 @@
+"""
+Saving a store to a file, and loading it back.
+
+The file holds each document's fields as its own pickle, followed by the
+tree of collections and documents with the position of every document's
+pickle, its create and update times, its indexes with their contents, and
+a trailer pointing at the tree:
+
+    MAGIC | fields pickles | tree pickle | tree offset (8 bytes)
+
+Loading lazily memory-maps the file and leaves every document's pickle
+undecoded until its fields are first read.
+
+Files are pickles: only load files you trust.
+"""
+import gc
+import mmap
+import pickle
+import struct
+from array import array
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, IO, List, Optional, Tuple  # noqa: F401
+
+from mockfirestore._helpers import Document
+from mockfirestore.store import Clock, CollectionNode, DocumentNode, Store
+
+MAGIC = b'MOCKFS\x00\x04'
+_TRAILER = struct.Struct('<Q')
+# The position of a document without fields.
+_EMPTY = -1
+
+_fields_slot = DocumentNode.fields
+_decode_lock = Lock()
+
+
+class _LazyDocumentNode(DocumentNode):
+    """A loaded document whose fields are decoded from the file on first read."""
+    __slots__ = ('_source',)
+
+    def __init__(self, owner: object, source: Tuple[Any, int, int]) -> None:
+        # The fields slot is left empty until decoded.
+        self.owner = owner
+        self.version = 0
+        self.created = 0
+        self.collections = {}  # type: Dict[str, CollectionNode]
+        self._source = source
+
+    @property
+    def fields(self) -> Optional[Document]:
+        if self._source is not None:
+            with _decode_lock:
+                if self._source is not None:
+                    buffer, offset, length = self._source
+                    _fields_slot.__set__(self, pickle.loads(buffer[offset:offset + length]))
+                    self._source = None
+        return _fields_slot.__get__(self)
+
+    @fields.setter
+    def fields(self, fields: Optional[Document]):
+        self._source = None
+        _fields_slot.__set__(self, fields)
+
+
+def save_store(store: Store, path: str):
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        tree = [_save_collection(name, collection, file) for name, collection in store.collections.items()]
+        tree_offset = file.tell()
+        pickle.dump(tree, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.write(_TRAILER.pack(tree_offset))
+
+
+def _save_collection(name: str, collection: CollectionNode, file: IO[bytes]) -> tuple:
+    """
+    :returns: (name, count, index keys, document IDs, offsets, lengths,
+    update times, create times, subcollections by document position,) with
+    the offsets, lengths and times as packed arrays, which pickle far more
+    compactly than lists of tuples.
+    """
+    doc_ids = []
+    offsets = array('q')
+    lengths = array('q')
+    versions = array('q')
+    created = array('q')
+    subcollections = {}  # type: Dict[int, List[tuple]]
+    documents = collection.documents
+    for position, doc_id in enumerate(collection.ids):
+        document = documents[doc_id]
+        fields = document.fields
+        doc_ids.append(doc_id)
+        versions.append(document.version)
+        created.append(document.created)
+        if fields == {}:
+            offsets.append(_EMPTY)
+            lengths.append(0)
+        else:
+            offsets.append(file.tell())
+            lengths.append(file.write(pickle.dumps(fields, protocol=pickle.HIGHEST_PROTOCOL)))
+        if document.collections:
+            subcollections[position] = [_save_collection(sub_name, subcollection, file)
+                                        for sub_name, subcollection in document.collections.items()]
+    # Indexes are saved whole, so loading needs no document to rebuild them.
+    indexes = {key: index.copy() for key, index in collection.indexes.items()}
+    return (name, collection.count, indexes, doc_ids, offsets, lengths,
+            versions, created, subcollections)
+
+
+def load_store(path: str, lazy: bool = False) -> Store:
+    """
+    Read a store saved by `save_store`. With `lazy`, the file is
+    memory-mapped and each document decoded the first time it is read.
+    Documents keep their create and update times.
+    """
+    with open(path, 'rb') as file:
+        if lazy:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buffer = file.read()
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a saved mockfirestore store: {}'.format(path))
+    tree_offset, = _TRAILER.unpack(buffer[-_TRAILER.size:])
+    store = Store()
+    if not lazy:
+        buffer = memoryview(buffer)
+    with _gc_paused():
+        tree = pickle.loads(buffer[tree_offset:-_TRAILER.size])
+        for entry in tree:
+            store._root.collections[entry[0]] = _load_collection(entry, store, buffer, lazy)
+    # Later writes must still get later times than any loaded one.
+    store._versions = Clock(max(_max_versions(entry) for entry in tree) if tree else 0)
+    for collection_path, _ in store.walk_collections():
+        store._register_collection(collection_path)
+    return store
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Hold off the cyclic garbage collector, which would otherwise walk the
+    growing tree again and again while millions of objects are allocated.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load_collection(entry: tuple, store: Store, buffer: Any, lazy: bool) -> CollectionNode:
+    name, count, indexes, doc_ids, offsets, lengths, versions, created, subcollections = entry
+    collection = CollectionNode(store._owner)
+    collection.count = count
+    collection.indexes = indexes
+    nodes = collection.documents  # type: Dict[str, DocumentNode]
+    for position, doc_id in enumerate(doc_ids):
+        offset = offsets[position]
+        if offset == _EMPTY:
+            document = DocumentNode(store._owner)
+        elif lazy:
+            document = _LazyDocumentNode(store._owner, (buffer, offset, lengths[position]))
+        else:
+            document = DocumentNode(store._owner, pickle.loads(buffer[offset:offset + lengths[position]]))
+        document.version = versions[position]
+        document.created = created[position]
+        for subcollection in subcollections.get(position, ()):
+            document.collections[subcollection[0]] = _load_collection(subcollection, store, buffer, lazy)
+        nodes[doc_id] = document
+    # Saved in ID order, so this sort only checks it.
+    collection.ids = sorted(doc_ids)
+    return collection
+
+
+def _max_versions(entry: tuple) -> int:
+    """The latest update time in a saved collection and its subcollections."""
+    latest = max(entry[6], default=0)
+    for subcollections in entry[8].values():
+        for subcollection in subcollections:
+            latest = max(latest, _max_versions(subcollection))
+    return latest
@@ -1,12 +1,19 @@
+import heapq
+import operator
 import warnings
-from itertools import islice, tee
-from typing import Iterator, Any, Optional, List, Callable, Union
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Any, Optional, List, Callable, Set, Tuple, Union  # noqa: F401
 
 from mockfirestore.document import DocumentSnapshot
-from mockfirestore._helpers import T
+from mockfirestore._helpers import T, MISSING, get_equality_key, get_field_value, get_sort_key
+from mockfirestore.index import SORTED
 
 
 class Query:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
     def __init__(self, parent: Any, projection=None,
                  field_filters=(), orders=(), limit=None, offset=None,
                  start_at=None, end_at=None, all_descendants=False) -> None:
@@ -25,24 +32,22 @@ class Query:
                 self._add_field_filter(*field_filter)
 
     def stream(self, transaction=None) -> Iterator[DocumentSnapshot]:
-        doc_snapshots = self.parent.stream()
-
-        for field, compare, value in self._field_filters:
-            doc_snapshots = [doc_snapshot for doc_snapshot in doc_snapshots
-                             if compare(doc_snapshot._get_by_field_path(field), value)]
+        return self._snapshots()
 
+    def _snapshots(self) -> Iterator[DocumentSnapshot]:
+        # Each stage consumes the previous one lazily, so an unordered query
+        # with a limit stops reading the collection once it has enough matches.
         if self.orders:
-            for key, direction in self.orders:
-                doc_snapshots = sorted(doc_snapshots,
-                                       key=lambda doc: doc.to_dict()[key],
-                                       reverse=direction == 'DESCENDING')
-        if self._start_at:
-            document_fields_or_snapshot, before = self._start_at
-            doc_snapshots = self._apply_cursor(document_fields_or_snapshot, doc_snapshots, before, True)
-
-        if self._end_at:
-            document_fields_or_snapshot, before = self._end_at
-            doc_snapshots = self._apply_cursor(document_fields_or_snapshot, doc_snapshots, before, False)
+            doc_snapshots = self._ordered_snapshots()
+        else:
+            doc_snapshots = self._filtered_snapshots()
+            if self._start_at:
+                document_fields_or_snapshot, before = self._start_at
+                doc_snapshots = self._apply_cursor(document_fields_or_snapshot, doc_snapshots, before, True)
+
+            if self._end_at:
+                document_fields_or_snapshot, before = self._end_at
+                doc_snapshots = self._apply_cursor(document_fields_or_snapshot, doc_snapshots, before, False)
 
         if self._offset:
             doc_snapshots = islice(doc_snapshots, self._offset, None)
@@ -52,33 +57,246 @@ class Query:
 
         return iter(doc_snapshots)
 
+    def _filtered_snapshots(self, doc_ids: Optional[Iterable[str]] = None) -> Iterator[DocumentSnapshot]:
+        """
+        Yield snapshots of the documents passing every filter, in path order,
+        or in the order of `doc_ids` when given.
+        """
+        if self.all_descendants:
+            # Each collection streams in ID order; merging by path keeps the
+            # whole group lazy.
+            streams = [self._filtered_collection(parent, collection)
+                       for parent, collection in self._collection_group()]
+            return heapq.merge(*streams, key=lambda snapshot: snapshot.reference._path)
+        collection = self.parent._store.get_collection(self.parent._path)
+        if collection is None:
+            return iter(())
+        return self._filtered_collection(self.parent, collection, doc_ids)
+
+    def _filtered_collection(self, parent: Any, collection: Any,
+                             doc_ids: Optional[Iterable[str]] = None) -> Iterator[DocumentSnapshot]:
+        field_paths = self._projection_paths()
+        read_time = parent._store.read_time()
+        for doc_id, fields, version, created in self._matching_documents(parent._path, collection, doc_ids):
+            yield DocumentSnapshot(parent.document(doc_id), fields, field_paths, created, version, read_time)
+
+    def _matching_documents(self, collection_path: List[str], collection: Any,
+                            doc_ids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, dict, int, int]]:
+        """
+        :returns: (ID, stored fields, update time, create time,) of the
+        collection's documents passing every filter.
+        """
+        if doc_ids is None:
+            doc_ids, field_filters = self._index_scan(collection_path)
+            doc_ids = collection.iter_ids() if doc_ids is None else sorted(doc_ids)
+        else:
+            field_filters = self._field_filters
+        matches, values = _bind_filters(field_filters)
+        documents = collection.documents
+
+        for doc_id in doc_ids:
+            document = documents.get(doc_id)
+            if document is None:
+                continue
+            version = document.version
+            created = document.created
+            fields = document.fields
+            if fields and matches(fields, values):
+                yield doc_id, fields, version, created
+
+    def _matching_fields(self) -> Iterator[dict]:
+        """
+        The stored fields of the documents passing every filter, in path order,
+        without building references or snapshots.
+        """
+        store = self.parent._store
+        if self.all_descendants:
+            streams = [((tuple(path) + (doc_id,), fields)
+                        for doc_id, fields, _, _ in self._matching_documents(list(path), collection))
+                       for path, collection in store.collection_group(self.parent.id)]
+            return (fields for _, fields in heapq.merge(*streams, key=lambda item: item[0]))
+        collection = store.get_collection(self.parent._path)
+        if collection is None:
+            return iter(())
+        return (match[1] for match in self._matching_documents(self.parent._path, collection))
+
+    def _matches(self, document: dict) -> bool:
+        """Whether a document's fields pass every filter."""
+        matches, values = _bind_filters(self._field_filters)
+        return matches(document, values)
+
+    def count(self, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._aggregation_query().count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._aggregation_query().sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> 'AggregationQuery':
+        return self._aggregation_query().avg(field_ref, alias)
+
+    def _aggregation_query(self) -> 'AggregationQuery':
+        from mockfirestore.aggregation import AggregationQuery
+
+        return AggregationQuery(self)
+
+    def on_snapshot(self, callback: Callable) -> 'Watch':
+        """
+        Call `callback(snapshots, changes, read_time)` with the results now
+        and after every write that changes them.
+        """
+        from mockfirestore.watch import Watch
+
+        return Watch(self.parent._store, callback, query=self)
+
+    def _collection_group(self) -> List[Tuple[Any, Any]]:
+        """:returns: (reference, node,) of every collection with this query's ID."""
+        from mockfirestore.collection import get_collection_reference
+
+        store = self.parent._store
+        return [(get_collection_reference(store, list(path), type(self.parent)), collection)
+                for path, collection in store.collection_group(self.parent.id)]
+
+    def _ordered_snapshots(self) -> Iterable[DocumentSnapshot]:
+        """
+        Sort by every order_by clause in one pass, with Firestore's cross-type
+        value ordering. Ties are broken by document ID in the direction of the
+        last clause, and documents missing an ordered field are left out.
+        Cursors hold order_by values and bound the keys that are kept.
+        """
+        ordering = _Ordering(self.orders)
+        start = ordering.cursor(*self._start_at) if self._start_at else None
+        end = ordering.cursor(*self._end_at) if self._end_at else None
+
+        doc_ids = self._index_walk(ordering, start, end)
+        if doc_ids is not None:
+            return self._filtered_snapshots(doc_ids)
+
+        start_key = (ordering.key(*start[:2]), start[2]) if start else None
+        end_key = (ordering.key(*end[:2]), end[2]) if end else None
+
+        def keyed_snapshots():
+            for snapshot in self._filtered_snapshots():
+                values = ordering.document_values(snapshot._doc)
+                if values is None:
+                    continue
+                key = ordering.key(values, tuple(snapshot.reference._path))
+                if ordering.within(key, start_key, end_key):
+                    yield key, snapshot
+
+        # Keys end with the document ID, so they are unique and snapshots are
+        # never compared.
+        if self._limit:
+            # Only the first offset + limit documents can make it out.
+            select = heapq.nlargest if ordering.sort_reverse else heapq.nsmallest
+            ordered = select((self._offset or 0) + self._limit, keyed_snapshots())
+        else:
+            ordered = sorted(keyed_snapshots(), reverse=ordering.sort_reverse)
+        return [snapshot for _, snapshot in ordered]
+
+    def _index_walk(self, ordering: '_Ordering', start: Optional[tuple],
+                    end: Optional[tuple]) -> Optional[Iterator[str]]:
+        """
+        Document IDs in query order, read straight from a sorted index on the
+        order_by field and bisected at the cursors, or None if no index covers
+        the ordering.
+        """
+        if len(self.orders) != 1 or self.all_descendants:
+            return None
+        collection = self.parent._store.get_collection(self.parent._path)
+        index = collection.indexes.get((self.orders[0][0], SORTED)) if collection else None
+        if index is None or not index.complete:
+            return None
+        bounds = []
+        for cursor in (start, end):
+            if cursor is None:
+                bounds.append(None)
+                continue
+            values, document_path, inclusive = cursor
+            if len(values) != 1 or not index.can_order(values[0]):
+                return None
+            bounds.append((values[0], document_path and document_path[-1], inclusive))
+        start_bound, end_bound = bounds
+        if ordering.reverse:
+            return index.scan(lower=end_bound, upper=start_bound, reverse=True)
+        return index.scan(lower=start_bound, upper=end_bound)
+
+    def _index_scan(self, collection_path: List[str]) -> Tuple[Optional[Set[str]], List[Any]]:
+        """
+        Narrow the collection down with any indexes that can answer the filters.
+
+        Field filters an index answers are settled; composite filters only
+        narrow the candidates down, and are still checked on each of them.
+
+        :returns: (candidate IDs or None if no index applies, filters left to check,)
+        """
+        store = self.parent._store
+        candidates = []
+        remaining_filters = []
+        for field_filter in self._field_filters:
+            ids = _index_candidates(store, collection_path, field_filter)
+            if ids is not None:
+                candidates.append(ids)
+            if ids is None or isinstance(field_filter, _CompositeFilter):
+                remaining_filters.append(field_filter)
+        return _intersect(candidates), remaining_filters
+
     def get(self) -> Iterator[DocumentSnapshot]:
         warnings.warn('Query.get is deprecated, please use Query.stream',
                       category=DeprecationWarning)
         return self.stream()
 
+    def select(self, field_paths: Iterable[str]) -> 'Query':
+        """Only return these fields of the documents. Their other fields are never copied."""
+        self.projection = list(field_paths)
+        return self
+
+    def _projection_paths(self) -> Optional[List[List[str]]]:
+        if self.projection is None:
+            return None
+        return [field_path.split('.') for field_path in self.projection]
+
     def _add_field_filter(self, field: str, op: str, value: Any):
-        compare = self._compare_func(op)
-        self._field_filters.append((field, compare, value))
+        self._field_filters.append(self._field_filter(field, op, value))
+
+    def _field_filter(self, field: str, op: str, value: Any) -> tuple:
+        """
+        :returns: (field, op, compare, value,) with the op string in the Python
+        client's spelling, and the operand of a membership filter as a set of
+        equality keys.
+        """
+        op = _OPERATOR_ALIASES.get(op, op)
+        if op in _MEMBERSHIP_OPERATORS:
+            value = _value_set(value)
+        return field, op, self._compare_func(op), value
 
     def where(self, field: Optional[str] = None, op: Optional[str] = None,
               value: Optional[Any] = None, filter: Optional[Any] = None) -> 'Query':
         if filter is not None:
-            # Assuming filter is an object with field_path, op_string, and value attributes
-            # similar to google.cloud.firestore_v1.base_query.FieldFilter
-            field_path = filter.field_path
-            op_string = filter.op_string
-            val = filter.value
+            self._field_filters.append(self._parse_filter(filter))
         elif field is not None and op is not None and value is not None:
-            field_path = field
-            op_string = op
-            val = value
+            self._add_field_filter(field, op, value)
         else:
             raise ValueError("Either 'filter' or all of 'field', 'op', and 'value' must be provided.")
-
-        self._add_field_filter(field_path, op_string, val)
         return self
 
+    def _parse_filter(self, filter: Any) -> Union[tuple, '_CompositeFilter']:
+        """
+        Read a `FieldFilter`, or an `Or` or `And` of filters, from
+        google.cloud.firestore_v1.base_query. As for transforms, the classes are
+        recognised by name so as not to depend on the library.
+        """
+        filter_type = filter.__class__.__name__
+        if filter_type in ('Or', 'And'):
+            return _CompositeFilter(filter_type.upper(),
+                                    [self._parse_filter(child) for child in filter.filters])
+        # Assuming filter is an object with field_path, op_string, and value attributes
+        # similar to google.cloud.firestore_v1.base_query.FieldFilter
+        op = filter.op_string
+        if getattr(op, 'name', None) in _NULL_OPERATORS:
+            # FieldFilter turns `== None` and `!= None` into unary operators.
+            return self._field_filter(filter.field_path, _NULL_OPERATORS[op.name], None)
+        return self._field_filter(filter.field_path, op, filter.value)
+
     def order_by(self, key: str, direction: Optional[str] = 'ASCENDING') -> 'Query':
         self.orders.append((key, direction))
         return self
@@ -109,43 +327,339 @@ class Query:
 
     def _apply_cursor(self, document_fields_or_snapshot: Union[dict, DocumentSnapshot], doc_snapshot: Iterator[DocumentSnapshot],
                       before: bool, start: bool) -> Iterator[DocumentSnapshot]:
-        docs, doc_snapshot = tee(doc_snapshot)
-        for idx, doc in enumerate(doc_snapshot):
-            index = None
-            if isinstance(document_fields_or_snapshot, dict):
-                for k, v in document_fields_or_snapshot.items():
-                    if doc.to_dict().get(k, None) == v:
-                        index = idx
-                    else:
-                        index = None
-                        break
-            elif isinstance(document_fields_or_snapshot, DocumentSnapshot):
-                if doc.id == document_fields_or_snapshot.id:
-                    index = idx
-            if index is not None:
-                if before and start:
-                    return islice(docs, index, None, None)
-                elif not before and start:
-                    return islice(docs, index + 1, None, None)
-                elif before and not start:
-                    return islice(docs, 0, index + 1, None)
-                elif not before and not start:
-                    return islice(docs, 0, index, None)
+        """Cut an unordered stream at the first document matching the cursor."""
+        if isinstance(document_fields_or_snapshot, DocumentSnapshot):
+            def matches(doc):
+                return doc.id == document_fields_or_snapshot.id
+        else:
+            def matches(doc):
+                return all(doc._doc.get(k, MISSING) == v
+                           for k, v in document_fields_or_snapshot.items())
+
+        for doc in doc_snapshot:
+            if matches(doc):
+                if before:
+                    yield doc
+                break
+            if not start:
+                yield doc
+        if start:
+            yield from doc_snapshot
 
     def _compare_func(self, op: str) -> Callable[[T, T], bool]:
-        if op == '==':
-            return lambda x, y: x == y
-        elif op == '<':
-            return lambda x, y: x < y
-        elif op == '<=':
-            return lambda x, y: x <= y
-        elif op == '>':
-            return lambda x, y: x > y
-        elif op == '>=':
-            return lambda x, y: x >= y
-        elif op == 'in':
-            return lambda x, y: x in y
-        elif op == 'array_contains':
-            return lambda x, y: y in x
-        elif op == 'array_contains_any':
-            return lambda x, y: any([val in y for val in x])
+        return _COMPARATORS.get(op)
+
+
+class _Ordering:
+    """The sort keys of an ordered query, and cursor positions in that order."""
+
+    def __init__(self, orders: List[Tuple[str, Optional[str]]]) -> None:
+        self.fields = [field for field, _ in orders]
+        self._paths = [field.split('.') for field in self.fields]
+        descending = [direction == Query.DESCENDING for _, direction in orders]
+        # Ties are broken by document ID, in the direction of the last clause.
+        self.reverse = descending[-1]
+        self._descending = descending + [self.reverse]
+        # When every clause runs the same way, keys are sorted in reverse
+        # rather than wrapped one by one.
+        self._mixed = any(direction != self.reverse for direction in descending)
+        self.sort_reverse = self.reverse and not self._mixed
+
+    def key(self, values: List[Any], document_path: Optional[tuple] = None) -> tuple:
+        parts = [get_sort_key(value) for value in values]
+        if document_path is not None:
+            parts.append(document_path)
+        if self._mixed:
+            parts = [_Descending(part) if descending else part
+                     for part, descending in zip(parts, self._descending)]
+        return tuple(parts)
+
+    def document_values(self, document: dict) -> Optional[List[Any]]:
+        """The ordered field values of a document, or None if one is missing."""
+        values = []
+        for path in self._paths:
+            value = get_field_value(document, path)
+            if value is MISSING:
+                return None
+            values.append(value)
+        return values
+
+    def cursor(self, cursor: Union[dict, list, tuple, DocumentSnapshot],
+               inclusive: bool) -> Tuple[List[Any], Optional[str], bool]:
+        """
+        A cursor holds values for the order_by fields: as a dict of fields, as a
+        list of values in order_by order, or as a snapshot, which also pins the
+        document.
+
+        :returns: (values, document path or None, inclusive,)
+        """
+        document_path = None
+        if isinstance(cursor, DocumentSnapshot):
+            values = self.document_values(cursor._doc) if cursor.exists else None
+            document_path = tuple(cursor.reference._path)
+        elif isinstance(cursor, dict):
+            values = self.document_values(cursor)
+        else:
+            values = list(cursor)
+            if len(values) > len(self.fields):
+                raise ValueError('Too many cursor values for order_by fields {}'.format(self.fields))
+        if not values:
+            raise ValueError('Cursor has no values for order_by fields {}'.format(self.fields))
+        return values, document_path, inclusive
+
+    def precedes(self, key: tuple, other: tuple) -> bool:
+        """Whether `key` comes strictly before `other` in query order."""
+        return other < key if self.sort_reverse else key < other
+
+    def within(self, key: tuple, start: Optional[Tuple[tuple, bool]],
+               end: Optional[Tuple[tuple, bool]]) -> bool:
+        """Whether a document key falls between a start and an end cursor key."""
+        if start is not None:
+            cursor, inclusive = start
+            prefix = key[:len(cursor)]
+            if self.precedes(prefix, cursor) if inclusive else not self.precedes(cursor, prefix):
+                return False
+        if end is not None:
+            cursor, inclusive = end
+            prefix = key[:len(cursor)]
+            if self.precedes(cursor, prefix) if inclusive else not self.precedes(prefix, cursor):
+                return False
+        return True
+
+
+class _Descending:
+    """Inverts the ordering of a sort key."""
+    __slots__ = ('key',)
+
+    def __init__(self, key: Any) -> None:
+        self.key = key
+
+    def __eq__(self, other: '_Descending') -> bool:
+        return self.key == other.key
+
+    def __lt__(self, other: '_Descending') -> bool:
+        return other.key < self.key
+
+
+class _CompositeFilter:
+    """An `OR` or an `AND` of field filters and composite filters."""
+    __slots__ = ('op', 'filters')
+
+    def __init__(self, op: str, filters: List[Any]) -> None:
+        self.op = op
+        self.filters = filters
+
+
+def _index_candidates(store: Any, collection_path: List[str], field_filter: Any) -> Optional[Set[str]]:
+    """
+    The IDs of the documents that may pass a filter, read from indexes, or
+    None if the indexes cannot tell. A disjunction needs every branch indexed.
+    """
+    if not isinstance(field_filter, _CompositeFilter):
+        field, op, _, value = field_filter
+        return store.lookup(collection_path, field, op, value)
+    branches = [_index_candidates(store, collection_path, child) for child in field_filter.filters]
+    if field_filter.op == 'AND':
+        return _intersect([ids for ids in branches if ids is not None])
+    if any(ids is None for ids in branches):
+        return None
+    return set().union(*branches)
+
+
+def _intersect(id_sets: List[Set[str]]) -> Optional[Set[str]]:
+    """Intersect from the smallest set up, or None if there are no sets."""
+    if not id_sets:
+        return None
+    id_sets = sorted(id_sets, key=len)
+    ids = set(id_sets[0])
+    for other in id_sets[1:]:
+        if not ids:
+            break
+        ids &= other
+    return ids
+
+
+def _value_set(values: Iterable[Any]) -> Union[frozenset, tuple]:
+    """
+    The operand of a membership filter, as a set of equality keys (see
+    `get_equality_key`), or a tuple of them if some cannot be hashed.
+    """
+    keys = [get_equality_key(value) for value in values]
+    try:
+        return frozenset(keys)
+    except TypeError:
+        return tuple(keys)
+
+
+def _contains(keys: Union[frozenset, tuple], value: Any) -> bool:
+    try:
+        return get_equality_key(value) in keys
+    except TypeError:
+        # A key that cannot be hashed cannot equal any member of a set.
+        return False
+
+
+# Types whose values are equal exactly when Firestore holds them equal, when
+# both sides are of the same one.
+_NATIVELY_EQUAL = frozenset((type(None), bool, int, str, bytes))
+
+
+def _equal(x: T, y: T) -> bool:
+    if type(x) is type(y) and type(x) in _NATIVELY_EQUAL:
+        return x == y
+    return x is not MISSING and get_equality_key(x) == get_equality_key(y)
+
+
+def _in(x: T, y: T) -> bool:
+    return x is not MISSING and _contains(y, x)
+
+
+def _not_in(x: T, y: T) -> bool:
+    return x is not MISSING and not _contains(y, x)
+
+
+def _not_equal(x: T, y: T) -> bool:
+    return x is not MISSING and not _equal(x, y)
+
+
+# Types whose values compare among themselves as Firestore orders them.
+_NATIVELY_ORDERED = frozenset((bool, int, float, str, bytes))
+
+
+def _range_comparator(compare: Callable[[Any, Any], bool]) -> Callable[[T, T], bool]:
+    """
+    A range comparison in Firestore's ordering, answering as sorted indexes
+    do: only values of the operand's type match, and never NaN or a missing
+    field.
+    """
+    def matches(x: T, y: T) -> bool:
+        if type(x) is type(y) and type(x) in _NATIVELY_ORDERED:
+            # NaN already compares false with everything.
+            return compare(x, y)
+        if x is MISSING:
+            return False
+        x_order, x_key = get_sort_key(x)
+        y_order, y_key = get_sort_key(y)
+        if x_order != y_order or (x_order == 2 and not (x_key[0] and y_key[0])):
+            return False
+        # Equal keys in tuples compare without `<`, which nulls lack.
+        return compare((x_key,), (y_key,))
+    return matches
+
+
+def _array_contains(x: T, y: T) -> bool:
+    if not isinstance(x, list):
+        return False
+    key = get_equality_key(y)
+    return any(get_equality_key(item) == key for item in x)
+
+
+def _array_contains_any(x: T, y: T) -> bool:
+    return isinstance(x, list) and any(_contains(y, val) for val in x)
+
+
+# Comparisons by filter operator, called with (field value, filter value).
+_COMPARATORS = {
+    '==': _equal,
+    '!=': _not_equal,
+    '<': _range_comparator(operator.lt),
+    '<=': _range_comparator(operator.le),
+    '>': _range_comparator(operator.gt),
+    '>=': _range_comparator(operator.ge),
+    'in': _in,
+    'not-in': _not_in,
+    'array_contains': _array_contains,
+    'array_contains_any': _array_contains_any,
+}  # type: Dict[str, Callable[[T, T], bool]]
+
+# Other spellings of the operators, as used by the other client libraries.
+_OPERATOR_ALIASES = {
+    'array-contains': 'array_contains',
+    'array-contains-any': 'array_contains_any',
+    'not_in': 'not-in',
+}
+
+# The unary operators of null checks, as the comparisons they stand for.
+_NULL_OPERATORS = {'IS_NULL': '==', 'IS_NOT_NULL': '!='}
+
+# Operators whose operand is a list of values, matched by membership.
+_MEMBERSHIP_OPERATORS = frozenset(('in', 'not-in', 'array_contains_any'))
+
+
+def _bind_filters(field_filters: List[Any]) -> Tuple[Callable[[dict, tuple], bool], tuple]:
+    """:returns: (compiled predicate for the filters' shape, the filter values to call it with,)"""
+    values = []
+    shape = _filter_shape(_CompositeFilter('AND', field_filters), values)
+    return _compile_filters(shape), tuple(values)
+
+
+def _filter_shape(field_filter: Any, values: List[Any]) -> tuple:
+    """
+    The shape of a filter: (field, op,) for a field filter, and (op, child
+    shapes,) for a composite one. Filter values are appended to `values`.
+    """
+    if isinstance(field_filter, _CompositeFilter):
+        return field_filter.op, tuple(_filter_shape(child, values) for child in field_filter.filters)
+    field, op, _, value = field_filter
+    values.append(value)
+    return field, op
+
+
+# Rough selectivity of each operator, to check the likeliest misses first.
+_SELECTIVITY = {'==': 0, 'in': 1, 'array_contains': 1, 'array_contains_any': 2}
+
+
+@lru_cache(maxsize=256)
+def _compile_filters(shape: tuple) -> Callable[[dict, tuple], bool]:
+    """
+    A predicate over stored fields for filters of this shape (see
+    `_filter_shape`). Paths are split and comparisons looked up once per
+    shape, so queries differing only in their values share it; the values
+    are passed at call time. Conjunctions check the most selective filters
+    first and stop at the first miss; disjunctions stop at the first match.
+    """
+    predicate, _, _ = _compile_node(shape, 0)
+    return predicate
+
+
+def _compile_node(shape: tuple, position: int) -> Tuple[Callable[[dict, tuple], bool], int, int]:
+    """:returns: (predicate, position of the next filter value, selectivity rank,)"""
+    op, children = shape
+    if not isinstance(children, tuple):
+        # A missing field is MISSING, which no filter matches, as no index
+        # holds documents without the field.
+        get, compare = _field_getter(op), _COMPARATORS.get(children)
+        return (lambda document, values: compare(get(document), values[position]),
+                position + 1, _SELECTIVITY.get(children, 3))
+    compiled = []
+    for child in children:
+        predicate, position, rank = _compile_node(child, position)
+        compiled.append((rank, len(compiled), predicate))
+    if op == 'AND':
+        compiled.sort()
+    predicates = tuple(predicate for _, _, predicate in compiled)
+    rank = min((rank for rank, _, _ in compiled), default=0) if op == 'AND' else 4
+    if len(predicates) == 1:
+        return predicates[0], position, rank
+    if op == 'AND':
+        def matches(document: dict, values: tuple) -> bool:
+            for predicate in predicates:
+                if not predicate(document, values):
+                    return False
+            return True
+    else:
+        def matches(document: dict, values: tuple) -> bool:
+            for predicate in predicates:
+                if predicate(document, values):
+                    return True
+            return False
+    return matches, position, rank
+
+
+def _field_getter(field: str) -> Callable[[dict], Any]:
+    """Read a field, or MISSING if it is missing, from stored fields."""
+    path = field.split('.')
+    if len(path) == 1:
+        key = path[0]
+        return lambda document: document.get(key, MISSING)
+    return lambda document: get_field_value(document, path)
@@ -0,0 +1,636 @@
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from copy import deepcopy
+from threading import Lock, RLock
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Any, Union
+
+from mockfirestore._helpers import Document, time_ns
+from mockfirestore.index import INDEX_TYPES, HASH
+
+
+class DocumentNode:
+    """
+    A stored document: its fields, kept apart from its subcollections so that
+    reading a document never touches the data beneath it.
+
+    Nodes may be shared between forked stores; `owner` is the token of the
+    only store allowed to modify this one. `version` changes on every write
+    to the fields, and is 0 until the first one: it is the time of the last
+    write, in nanoseconds since the epoch. `created` is the time the
+    document last came into existence, and 0 while it does not exist.
+    """
+    __slots__ = ('owner', 'fields', 'version', 'created', 'collections')
+
+    def __init__(self, owner: object, fields: Optional[Document] = None) -> None:
+        self.owner = owner
+        # `None` is what a `WriteBatch.delete` leaves behind.
+        self.fields = {} if fields is None else fields
+        self.version = 0
+        self.created = 0
+        self.collections = {}  # type: Dict[str, CollectionNode]
+
+    def copy(self, owner: object) -> 'DocumentNode':
+        # Stored fields are never modified in place, so they can be shared.
+        node = DocumentNode(owner, self.fields)
+        node.version = self.version
+        node.created = self.created
+        node.collections = dict(self.collections)
+        return node
+
+    def write(self, fields: Optional[Document], version: int):
+        """Store new fields, written at time `version`."""
+        if not fields:
+            self.created = 0
+        elif not self.fields:
+            self.created = version
+        self.fields = fields
+        self.version = version
+
+
+class Clock:
+    """
+    Wall-clock time in nanoseconds since the epoch, as ints, but strictly
+    increasing: each call to `next` returns a time no other call of this
+    clock does, even within the same nanosecond or if the wall clock steps
+    back.
+    """
+
+    def __init__(self, last: int = 0) -> None:
+        self._last = last
+        self._lock = Lock()
+
+    def __iter__(self) -> 'Clock':
+        return self
+
+    def __next__(self) -> int:
+        with self._lock:
+            self._last = max(time_ns(), self._last + 1)
+            return self._last
+
+    def now(self) -> int:
+        """The current time, never earlier than a time already handed out."""
+        return max(time_ns(), self._last)
+
+    def advance(self, last: int):
+        """Only hand out times after `last` from now on."""
+        with self._lock:
+            self._last = max(self._last, last)
+
+
+class CollectionNode:
+    """
+    A stored collection: its documents by ID, the same IDs in sorted order,
+    the indexes declared on it, and how many of the documents exist.
+
+    Documents are added and removed with `add_document` and `remove_document`,
+    which keep `ids` sorted, so a scan in ID order can stop early without
+    sorting the whole collection first.
+    """
+    __slots__ = ('owner', 'documents', 'ids', 'indexes', 'count', 'lock')
+
+    def __init__(self, owner: object) -> None:
+        self.owner = owner
+        self.documents = {}  # type: Dict[str, DocumentNode]
+        self.ids = []  # type: List[str]
+        self.indexes = {}  # type: Dict[Tuple[str, str], Any]
+        self.count = 0
+        # Guards `count` and `ids`, which writers to different documents share.
+        self.lock = Lock()
+
+    def copy(self, owner: object) -> 'CollectionNode':
+        node = CollectionNode(owner)
+        node.documents = dict(self.documents)
+        node.ids = list(self.ids)
+        node.indexes = {key: index.copy() for key, index in self.indexes.items()}
+        node.count = self.count
+        return node
+
+    def add_to_count(self, delta: int):
+        if delta:
+            with self.lock:
+                self.count += delta
+
+    def add_document(self, doc_id: str, document: 'DocumentNode') -> 'DocumentNode':
+        """Add a document unless one with this ID is already here; :returns: the one kept."""
+        with self.lock:
+            kept = self.documents.setdefault(doc_id, document)
+            if kept is document:
+                insort(self.ids, doc_id)
+        return kept
+
+    def add_documents(self, documents: Dict[str, 'DocumentNode']):
+        """Add documents whose IDs are not here yet, sorting the IDs once."""
+        if documents:
+            with self.lock:
+                self.documents.update(documents)
+                # Replaced rather than sorted in place, so scans already
+                # running keep a consistent list.
+                self.ids = sorted(self.ids + list(documents))
+
+    def remove_document(self, doc_id: str):
+        with self.lock:
+            del self.documents[doc_id]
+            del self.ids[bisect_left(self.ids, doc_id)]
+
+    def iter_ids(self) -> Iterator[str]:
+        """
+        The document IDs in order, lazily. Documents added or removed during
+        the scan may or may not be seen, but none is seen twice.
+        """
+        ids = self.ids
+        position = 0
+        while True:
+            try:
+                doc_id = ids[position]
+            except IndexError:
+                return
+            yield doc_id
+            if ids is self.ids and position < len(ids) and ids[position] == doc_id:
+                position += 1
+            else:
+                # A write moved this position, or replaced the list.
+                ids = self.ids
+                position = bisect_right(ids, doc_id)
+
+
+Node = Union[CollectionNode, DocumentNode]
+
+# The key holding a document's subcollections in the explicit nested-dict
+# layout. Firestore reserves field names like it, so it never clashes with a
+# field.
+SUBCOLLECTIONS = '__collections__'
+
+
+class Store:
+    """
+    The document tree behind a `MockFirestore`.
+
+    Collections hold documents and documents hold collections. Resolved
+    paths are cached in a flat dict, so resolving a path again is one dict
+    lookup however deep it is; a miss walks the tree, one dict lookup per
+    segment. Secondary indexes are opt-in, and are kept up to date by every
+    write that goes through the store.
+
+    Forking is copy-on-write: a fork shares the whole tree, and a store
+    copies a node (shallowly) the first time it writes beneath it. Copying
+    a collection node costs time in proportion to its documents, for its
+    map of documents, its sorted IDs and each index's map of document IDs;
+    the indexes' sets of IDs are shared until written to. So the first
+    write to a large collection after a fork or restore is slower than the
+    ones after it.
+
+    Every document write takes a new version from a store-wide clock, which
+    transactions use to detect conflicting writes, and snapshots report as
+    the document's update time.
+
+    The store is thread-safe. Each write holds its document's lock, taken
+    from a fixed pool of stripes, so writes to unrelated documents rarely
+    wait on each other; indexes lock themselves while being updated.
+    Read-modify-write sequences hold the lock across the read with `locked`.
+
+    Snapshot listeners (`Watch`) registered on the store are told about each
+    document write while its lock is held, so they see writes in order.
+    """
+    LOCK_STRIPES = 64
+
+    def __init__(self) -> None:
+        self._owner = object()
+        self._root = DocumentNode(self._owner)
+        # Paths of every collection, by collection ID, for collection groups.
+        self._collection_paths = {}  # type: Dict[str, Set[Tuple[str, ...]]]
+        self._collection_paths_shared = False
+        # Resolved nodes by path, as (epoch, the dict holding the node, node,).
+        # An entry is stale once its node was removed from that dict, or a
+        # copy-on-write replaced the dict itself, which starts a new epoch.
+        self._nodes = {}  # type: Dict[Tuple[str, ...], Tuple[int, dict, Node]]
+        self._epoch = 0
+        self._versions = Clock()
+        self._lock_stripes = [RLock() for _ in range(self.LOCK_STRIPES)]
+        # Guards the rare structural changes: copying shared nodes after a
+        # fork, and registering new collections.
+        self._structure_lock = Lock()
+        # Listeners by target: see `Watch.target`. Tuples are replaced, not
+        # modified, so writers can read them without a lock.
+        self._watches = {}  # type: Dict[Tuple[str, Any], Tuple[Any, ...]]
+        self._dispatcher = None
+
+    @property
+    def collections(self) -> Dict[str, CollectionNode]:
+        """The top-level collections; read-only, like every node reached from here."""
+        return self._root.collections
+
+    def fork(self) -> 'Store':
+        """
+        A copy of this store in constant time, sharing every node with it.
+        Writes in progress finish first, so none of them reaches the copy
+        halfway. Either store's first write to a collection afterwards copies
+        that collection's node, in time proportional to its size.
+        """
+        store = Store()
+        with self._locked_stripes(range(self.LOCK_STRIPES)):
+            with self._structure_lock:
+                store._versions = Clock(next(self._versions))
+                store._root = self._root
+                store._collection_paths = self._collection_paths
+                store._collection_paths_shared = self._collection_paths_shared = True
+                # Neither store owns the shared nodes any more.
+                self._owner = object()
+        return store
+
+    def restore(self, other: 'Store'):
+        """
+        Take on the documents, collections and indexes of `other` in place,
+        so that existing references and listeners follow. `other` is left
+        untouched: both share its nodes, copied on write as after a fork.
+        Listeners are told about every document that changed.
+        """
+        with self._locked_stripes(range(self.LOCK_STRIPES)):
+            with self._structure_lock:
+                # Neither store owns the shared nodes any more.
+                other._owner = object()
+                self._owner = object()
+                self._root = other._root
+                self._collection_paths = other._collection_paths
+                self._collection_paths_shared = other._collection_paths_shared = True
+                self._nodes = {}
+                self._epoch += 1
+                self._versions.advance(other._versions.now())
+                watches = [watch for target in self._watches.values() for watch in target]
+            for watch in watches:
+                watch.on_reset()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Store':
+        """
+        Build a store from the nested-dict layout: {collection: {document ID:
+        fields}}. A document lists its subcollections under its
+        `SUBCOLLECTIONS` key, as {name: {document ID: fields}}, and then
+        every other key is a field, whatever its value. A document without
+        that key is read the original way: a non-empty dict whose values are
+        all dicts is a subcollection, anything else a field.
+        """
+        store = cls()
+        for name, documents in data.items():
+            store._root.collections[name] = _import_collection(documents, store)
+        for path, _ in store.walk_collections():
+            store._register_collection(path)
+        return store
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Export a deep copy of the store in the nested-dict layout. A document
+        uses the `SUBCOLLECTIONS` key only when the original layout would
+        read it back differently, so both layouts round-trip.
+        """
+        return {name: _export_collection(collection)
+                for name, collection in self.collections.items()}
+
+    def _get_node(self, path: Sequence[str], create: bool = False,
+                  mutable: bool = False) -> Optional[Node]:
+        """
+        Resolve a path. With `mutable` (implied by `create`), every node along
+        it is first made this store's own, so the result may be modified.
+        """
+        mutable = mutable or create
+        key = tuple(path)
+        entry = self._nodes.get(key)
+        if entry is not None:
+            epoch, children, node = entry
+            # Nodes this store owns only ever have owned parents.
+            if (epoch == self._epoch and children.get(key[-1]) is node
+                    and (not mutable or node.owner is self._owner)):
+                return node
+        epoch = self._epoch
+        if mutable and self._root.owner is not self._owner:
+            with self._structure_lock:
+                if self._root.owner is not self._owner:
+                    self._root = self._root.copy(self._owner)
+                    self._epoch += 1
+        node = parent = self._root  # type: Node
+        for depth in range(len(path)):
+            parent = node
+            node = self._child(node, path, depth, create, mutable)
+            if node is None:
+                return None
+        if key:
+            self._nodes[key] = (epoch, parent.documents if len(key) % 2 == 0 else parent.collections, node)
+        return node
+
+    def _child(self, node: Node, path: Sequence[str], depth: int,
+               create: bool, mutable: bool) -> Optional[Node]:
+        """One step of `_get_node`: the child of `node` at `path[depth]`."""
+        is_collection = depth % 2 == 0
+        children = node.collections if is_collection else node.documents
+        key = path[depth]
+        child = children.get(key)
+        if child is None:
+            if not create:
+                return None
+            new_child = CollectionNode(self._owner) if is_collection else DocumentNode(self._owner)
+            # Two writers may race to create the same node; one of them wins.
+            if is_collection:
+                child = children.setdefault(key, new_child)
+            else:
+                child = node.add_document(key, new_child)
+            if is_collection and child is new_child:
+                self._register_collection(tuple(path[:depth + 1]))
+        elif mutable and child.owner is not self._owner:
+            with self._structure_lock:
+                child = children[key]
+                if child.owner is not self._owner:
+                    child = children[key] = child.copy(self._owner)
+                    self._epoch += 1
+        return child
+
+    def _register_collection(self, path: Tuple[str, ...]):
+        with self._structure_lock:
+            if self._collection_paths_shared:
+                self._collection_paths = {collection_id: set(paths) for collection_id, paths
+                                          in self._collection_paths.items()}
+                self._collection_paths_shared = False
+            self._collection_paths.setdefault(path[-1], set()).add(path)
+
+    def get_collection(self, path: Sequence[str], create: bool = False,
+                       mutable: bool = False) -> Optional[CollectionNode]:
+        return self._get_node(path, create, mutable)
+
+    def get_document(self, path: Sequence[str], create: bool = False,
+                     mutable: bool = False) -> Optional[DocumentNode]:
+        return self._get_node(path, create, mutable)
+
+    def get_fields(self, path: Sequence[str]) -> Optional[Document]:
+        """The stored fields of a document; `{}` if it was never written."""
+        document = self.get_document(path)
+        return {} if document is None else document.fields
+
+    def get_all_fields(self, paths: Iterable[Sequence[str]]) -> List[Tuple[int, int, Optional[Document]]]:
+        """The versions and fields of many documents, as `get_versioned_fields`, resolving each collection once."""
+        collections = {}  # type: Dict[Tuple[str, ...], Optional[CollectionNode]]
+        results = []
+        for path in paths:
+            collection_path = tuple(path[:-1])
+            if collection_path in collections:
+                collection = collections[collection_path]
+            else:
+                collection = collections[collection_path] = self.get_collection(collection_path)
+            document = None if collection is None else collection.documents.get(path[-1])
+            results.append(_versioned_fields(document))
+        return results
+
+    def get_version(self, path: Sequence[str]) -> int:
+        """The version of a document's fields; 0 if it was never written or was removed."""
+        document = self.get_document(path)
+        return 0 if document is None else document.version
+
+    def get_versioned_fields(self, path: Sequence[str]) -> Tuple[int, int, Optional[Document]]:
+        """:returns: (version, create time, fields,) of a document, as `get_version` and `get_fields`."""
+        return _versioned_fields(self.get_document(path))
+
+    def read_time(self) -> int:
+        """The time of a read, in nanoseconds: not before any write it sees."""
+        return self._versions.now()
+
+    def set_fields(self, path: Sequence[str], fields: Optional[Document]) -> int:
+        """
+        Store a document's fields, which the store then owns. Stored fields
+        must never be mutated in place, since snapshots share them: copy,
+        modify and store the copy instead.
+
+        :returns: the new version of the document.
+        """
+        with self.locked([path]):
+            collection = self.get_collection(path[:-1], create=True)
+            document = self._child(collection, path, len(path) - 1, create=True, mutable=True)
+            collection.add_to_count(bool(fields) - bool(document.fields))
+            version = next(self._versions)
+            document.write(fields, version)
+            self._reindex(path, fields)
+            self._notify(path, fields, document)
+        return version
+
+    def bulk_load(self, collection_path: Sequence[str],
+                  documents: Iterable[Tuple[str, Document]]) -> int:
+        """
+        Store many documents of one collection, as `set_fields` would, but
+        without resolving the path for each of them. The collection's indexes
+        are brought up to date in one pass at the end.
+
+        :returns: the number of documents loaded.
+        """
+        with self._locked_stripes(range(self.LOCK_STRIPES)):
+            collection = self.get_collection(collection_path, create=True)
+            nodes = collection.documents
+            added = {}  # type: Dict[str, DocumentNode]
+            loaded = []
+            delta = 0
+            for doc_id, fields in documents:
+                document = nodes.get(doc_id) or added.get(doc_id)
+                if document is None:
+                    document = added[doc_id] = DocumentNode(self._owner)
+                elif document.owner is not self._owner:
+                    document = nodes[doc_id] = document.copy(self._owner)
+                    self._epoch += 1
+                delta += bool(fields) - bool(document.fields)
+                document.write(fields, next(self._versions))
+                loaded.append((doc_id, fields))
+            collection.add_documents(added)
+            collection.add_to_count(delta)
+            for index in collection.indexes.values():
+                index.update_many(loaded)
+            if self._watches:
+                for doc_id, fields in loaded:
+                    self._notify(list(collection_path) + [doc_id], fields, nodes[doc_id])
+        return len(loaded)
+
+    @contextmanager
+    def locked(self, paths: Iterable[Sequence[str]]):
+        """Hold the locks of these documents, taken in a fixed order to avoid deadlocks."""
+        with self._locked_stripes({hash(tuple(path)) % self.LOCK_STRIPES for path in paths}):
+            yield
+
+    @contextmanager
+    def _locked_stripes(self, stripes: Iterable[int]):
+        stripes = sorted(stripes)
+        for stripe in stripes:
+            self._lock_stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._lock_stripes[stripe].release()
+
+    def delete_document(self, path: Sequence[str]):
+        with self.locked([path]):
+            collection = self.get_collection(path[:-1], mutable=True)
+            if collection is None or path[-1] not in collection.documents:
+                return
+            document = collection.documents[path[-1]]
+            collection.add_to_count(-bool(document.fields))
+            if document.collections:
+                # Subcollections outlive their parent document.
+                document = self.get_document(path, mutable=True)
+                document.write({}, next(self._versions))
+            else:
+                collection.remove_document(path[-1])
+                self._nodes.pop(tuple(path), None)
+            self._reindex(path, None)
+            self._notify(path, None, None)
+
+    @property
+    def dispatcher(self) -> Any:
+        """The thread running this store's listener callbacks, started on first use."""
+        if self._dispatcher is None:
+            from mockfirestore.watch import _Dispatcher
+
+            with self._structure_lock:
+                if self._dispatcher is None:
+                    self._dispatcher = _Dispatcher()
+        return self._dispatcher
+
+    def add_watch(self, watch: Any):
+        with self._structure_lock:
+            self._watches[watch.target] = self._watches.get(watch.target, ()) + (watch,)
+
+    def remove_watch(self, watch: Any):
+        with self._structure_lock:
+            watches = tuple(other for other in self._watches.get(watch.target, ()) if other is not watch)
+            if watches:
+                self._watches[watch.target] = watches
+            else:
+                self._watches.pop(watch.target, None)
+
+    def _notify(self, path: Sequence[str], fields: Optional[Document], document: Optional[DocumentNode]):
+        if not self._watches:
+            return
+        path = tuple(path)
+        targets = [('document', path), ('collection', path[:-1])]
+        if len(path) >= 2:
+            targets.append(('group', path[-2]))
+        for target in targets:
+            for watch in self._watches.get(target, ()):
+                watch.on_write(path, fields, document)
+
+    def count(self, collection_path: Sequence[str]) -> int:
+        """The number of existing documents in a collection, in constant time."""
+        collection = self.get_collection(collection_path)
+        return 0 if collection is None else collection.count
+
+    def collection_group(self, collection_id: str) -> List[Tuple[Tuple[str, ...], CollectionNode]]:
+        """:returns: (path, node,) of every collection with this ID, in path order."""
+        return [(path, self.get_collection(path))
+                for path in sorted(self._collection_paths.get(collection_id, ()))]
+
+    def walk_collections(self, prefix: Tuple[str, ...] = (),
+                         collections: Optional[Dict[str, CollectionNode]] = None) \
+            -> Iterator[Tuple[Tuple[str, ...], CollectionNode]]:
+        """:returns: (path, node,) for every collection in the tree."""
+        if collections is None:
+            collections = self.collections
+        for name, collection in collections.items():
+            path = prefix + (name,)
+            yield path, collection
+            for doc_id, document in collection.documents.items():
+                yield from self.walk_collections(path + (doc_id,), document.collections)
+
+    def create_index(self, collection_path: Sequence[str], field_path: str, kind: str = HASH):
+        if kind not in INDEX_TYPES:
+            raise ValueError('Unknown index kind: {}'.format(kind))
+        collection = self.get_collection(collection_path, create=True)
+        if (field_path, kind) in collection.indexes:
+            return
+        index = INDEX_TYPES[kind](field_path)
+        for doc_id, document in collection.documents.items():
+            index.update(doc_id, document.fields)
+        collection.indexes[(field_path, kind)] = index
+
+    def drop_index(self, collection_path: Sequence[str], field_path: str, kind: str = HASH):
+        collection = self.get_collection(collection_path, mutable=True)
+        if collection is not None:
+            collection.indexes.pop((field_path, kind), None)
+
+    def index_definitions(self) -> List[Tuple[Tuple[str, ...], str, str]]:
+        """:returns: (collection path, field path, kind,) for every declared index."""
+        return [(path, field_path, kind)
+                for path, collection in self.walk_collections()
+                for field_path, kind in collection.indexes]
+
+    def lookup(self, collection_path: Sequence[str], field_path: str,
+               op: str, value: Any) -> Optional[Set[str]]:
+        """IDs of the documents matching a filter, or None if no index can answer it."""
+        collection = self.get_collection(collection_path)
+        if collection is None:
+            return None
+        for (indexed_field, _), index in collection.indexes.items():
+            if indexed_field == field_path and op in index.operators:
+                return index.lookup(op, value)
+        return None
+
+    def _reindex(self, document_path: Sequence[str], fields: Optional[Document]):
+        collection = self.get_collection(document_path[:-1], mutable=True)
+        if collection is None:
+            return
+        for index in collection.indexes.values():
+            index.update(document_path[-1], fields)
+
+
+def _versioned_fields(document: Optional[DocumentNode]) -> Tuple[int, int, Optional[Document]]:
+    if document is None:
+        return 0, 0, {}
+    # Writers store the fields before the version, so reading in the
+    # opposite order never pairs old fields with a new version.
+    version = document.version
+    created = document.created
+    return version, created, document.fields
+
+
+def _is_collection(value: Any) -> bool:
+    return (isinstance(value, dict) and bool(value)
+            and all(isinstance(item, dict) for item in value.values()))
+
+
+def _import_collection(documents: Dict[str, Any], store: Store) -> CollectionNode:
+    collection = CollectionNode(store._owner)
+    for doc_id, data in documents.items():
+        document = collection.documents[doc_id] = DocumentNode(store._owner)
+        document.version = next(store._versions)
+        if data is None:
+            document.fields = None
+        elif SUBCOLLECTIONS in data:
+            data = dict(data)
+            for name, subcollection in data.pop(SUBCOLLECTIONS).items():
+                document.collections[name] = _import_collection(subcollection, store)
+            document.fields = data
+        elif not any(_is_collection(value) for value in data.values()):
+            document.fields = data
+        else:
+            for key, value in data.items():
+                if _is_collection(value):
+                    document.collections[key] = _import_collection(value, store)
+                else:
+                    document.fields[key] = value
+        if document.fields:
+            document.created = document.version
+        collection.count += bool(document.fields)
+    collection.ids = sorted(collection.documents)
+    return collection
+
+
+def _export_collection(collection: CollectionNode) -> Dict[str, Any]:
+    documents = {}
+    for doc_id, document in collection.documents.items():
+        data = deepcopy(document.fields)
+        collections = {name: _export_collection(subcollection)
+                       for name, subcollection in document.collections.items()}
+        if data and any(_is_collection(value) for value in data.values()):
+            # The original layout would read these fields as collections.
+            data[SUBCOLLECTIONS] = collections
+        elif any(not _is_collection(subcollection) or name in (data or {})
+                 for name, subcollection in collections.items()):
+            # Empty collections, or names shared with a field, need the key too.
+            data = data or {}
+            data[SUBCOLLECTIONS] = collections
+        elif collections:
+            data = data or {}
+            data.update(collections)
+        documents[doc_id] = data
+    return documents
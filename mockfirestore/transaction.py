@@ -1,26 +1,31 @@
-from functools import partial
 import random
-from typing import Iterable, Callable
-from mockfirestore._helpers import generate_random_string, Timestamp
-from mockfirestore.document import DocumentReference, DocumentSnapshot
+from typing import Dict, Iterable, Callable, Optional, Tuple  # noqa: F401
+from mockfirestore import Aborted
+from mockfirestore._helpers import generate_random_string
+from mockfirestore.document import DocumentReference, DocumentSnapshot, unique_references
 from mockfirestore.query import Query
+from mockfirestore.write_batch import WriteBatch, WriteResult
 
 MAX_ATTEMPTS = 5
 _MISSING_ID_TEMPLATE = "The transaction has no transaction ID, so it cannot be {}."
 _CANT_BEGIN = "The transaction has already begun. Current transaction ID: {!r}."
 _CANT_ROLLBACK = _MISSING_ID_TEMPLATE.format("rolled back")
 _CANT_COMMIT = _MISSING_ID_TEMPLATE.format("committed")
-
-
-class WriteResult:
-    def __init__(self):
-        self.update_time = Timestamp.from_now()
+_CONFLICT = "A document read by the transaction has since been written: {}."
+_EXCEED_ATTEMPTS_TEMPLATE = "Failed to commit transaction in {:d} attempts."
 
 
 class Transaction:
     """
     This mostly follows the model from
     https://googleapis.dev/python/firestore/latest/transaction.html
+
+    Concurrency is optimistic: reads record the version of each document they
+    return, and the commit fails with `Aborted` if any of them has been
+    written since. Use `transactional` to retry on conflicts.
+
+    Writes are buffered in a `WriteBatch`, so a commit applies all of them
+    or, if any is invalid, none.
     """
     def __init__(self, client,
                  max_attempts=MAX_ATTEMPTS, read_only=False):
@@ -28,7 +33,9 @@ class Transaction:
         self._max_attempts = max_attempts
         self._read_only = read_only
         self._id = None
-        self._write_ops = []
+        self._batch = WriteBatch(client)
+        # Version of every document read, by path.
+        self._read_versions = {}  # type: Dict[Tuple[str, ...], Optional[int]]
         self.write_results = None
 
     @property
@@ -44,7 +51,8 @@ class Transaction:
         self._id = generate_random_string()
 
     def _clean_up(self):
-        self._write_ops.clear()
+        self._batch._operations.clear()
+        self._read_versions.clear()
         self._id = None
 
     def _rollback(self):
@@ -57,23 +65,42 @@ class Transaction:
         if not self.in_progress:
             raise ValueError(_CANT_COMMIT)
 
-        results = []
-        for write_op in self._write_ops:
-            write_op()
-            results.append(WriteResult())
+        store = self._client._store
+        with store.locked(list(self._read_versions) + self._batch._paths()):
+            for path, version in self._read_versions.items():
+                if store.get_version(path) != version:
+                    raise Aborted(_CONFLICT.format(list(path)))
+            results = self._batch._apply(store)
         self.write_results = results
         self._clean_up()
         return results
 
+    def _read(self, reference: DocumentReference) -> DocumentSnapshot:
+        version, created, fields = self._client._store.get_versioned_fields(reference._path)
+        self._read_versions.setdefault(tuple(reference._path), version)
+        return reference._snapshot(version, created, fields)
+
+    def _read_query(self, query: Query) -> Iterable[DocumentSnapshot]:
+        store = self._client._store
+        for snapshot in query._snapshots():
+            path = snapshot.reference._path
+            version, _, fields = store.get_versioned_fields(path)
+            if fields is not snapshot._doc:
+                # Written since the query read it: the commit must fail.
+                version = None
+            self._read_versions.setdefault(tuple(path), version)
+            yield snapshot
+
     def get_all(self,
                 references: Iterable[DocumentReference]) -> Iterable[DocumentSnapshot]:
-        return self._client.get_all(references)
+        for reference in unique_references(references).values():
+            yield self._read(reference)
 
     def get(self, ref_or_query) -> Iterable[DocumentSnapshot]:
         if isinstance(ref_or_query, DocumentReference):
-            return self._client.get_all([ref_or_query])
+            return iter([self._read(ref_or_query)])
         elif isinstance(ref_or_query, Query):
-            return ref_or_query.stream()
+            return self._read_query(ref_or_query)
         else:
             raise ValueError(
                 'Value for argument "ref_or_query" must be a DocumentReference or a Query.'
@@ -82,31 +109,29 @@ class Transaction:
     # methods from
     # https://googleapis.dev/python/firestore/latest/batch.html#google.cloud.firestore_v1.batch.WriteBatch
 
-    def _add_write_op(self, write_op: Callable):
+    def _check_writable(self):
         if self._read_only:
             raise ValueError(
                 "Cannot perform write operation in read-only transaction."
             )
-        self._write_ops.append(write_op)
 
     def create(self, reference: DocumentReference, document_data):
-        # this is a no-op, because if we have a DocumentReference
-        # it's already in the MockFirestore
-        ...
+        self._check_writable()
+        self._batch.create(reference, document_data)
 
     def set(self, reference: DocumentReference, document_data: dict,
             merge=False):
-        write_op = partial(reference.set, document_data, merge=merge)
-        self._add_write_op(write_op)
+        self._check_writable()
+        self._batch.set(reference, document_data, merge=merge)
 
     def update(self, reference: DocumentReference,
                field_updates: dict, option=None):
-        write_op = partial(reference.update, field_updates)
-        self._add_write_op(write_op)
+        self._check_writable()
+        self._batch.update(reference, field_updates, option=option)
 
     def delete(self, reference: DocumentReference, option=None):
-        write_op = reference.delete
-        self._add_write_op(write_op)
+        self._check_writable()
+        self._batch.delete(reference, option=option)
 
     def commit(self):
         return self._commit()
@@ -117,3 +142,28 @@ class Transaction:
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is None:
             self.commit()
+
+
+class _Transactional:
+    """Runs a function in a transaction, retrying it when the commit conflicts."""
+    def __init__(self, to_wrap: Callable) -> None:
+        self.to_wrap = to_wrap
+
+    def __call__(self, transaction: Transaction, *args, **kwargs):
+        for _ in range(transaction._max_attempts):
+            transaction._begin()
+            try:
+                result = self.to_wrap(transaction, *args, **kwargs)
+                transaction._commit()
+                return result
+            except Aborted:
+                transaction._rollback()
+            except BaseException:
+                transaction._rollback()
+                raise
+        raise ValueError(_EXCEED_ATTEMPTS_TEMPLATE.format(transaction._max_attempts))
+
+
+def transactional(to_wrap: Callable) -> _Transactional:
+    """Decorate a function taking a transaction first, as `firestore.transactional`."""
+    return _Transactional(to_wrap)
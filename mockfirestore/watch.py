@@ -0,0 +1,264 @@
+import logging
+import queue
+import threading
+from bisect import bisect_left
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa: F401
+
+from mockfirestore._helpers import Document, Timestamp
+from mockfirestore.collection import get_collection_reference
+from mockfirestore.document import DocumentSnapshot
+from mockfirestore.query import _Descending, _Ordering
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ChangeType(Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    """
+    How one document changed in a listener's results. Indexes are positions
+    in the previous and the new results, and -1 where the document is absent.
+    """
+    def __init__(self, type: ChangeType, document: DocumentSnapshot,
+                 old_index: int, new_index: int) -> None:
+        self.type = type
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class _Dispatcher:
+    """Runs listener callbacks one at a time, in order, on a daemon thread."""
+
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+        thread = threading.Thread(target=self._run, name='mockfirestore-watch', daemon=True)
+        thread.start()
+
+    def submit(self, callback: Callable, *args):
+        self._queue.put((callback, args))
+
+    def _run(self):
+        while True:
+            callback, args = self._queue.get()
+            try:
+                callback(*args)
+            except Exception:
+                _LOGGER.exception('Snapshot listener callback failed')
+
+
+class Watch:
+    """
+    A listener on a document or a query, returned by `on_snapshot`.
+
+    The results are kept sorted in query order and updated from each write
+    to a document the listener covers, so a write costs a filter check and
+    a bisection rather than a new query. Callbacks receive the results, the
+    `DocumentChange`s and the read time, on the store's dispatcher thread.
+    """
+
+    def __init__(self, store: Any, callback: Callable, query: Any = None,
+                 document: Any = None) -> None:
+        self._store = store
+        self._callback = callback
+        self._query = query
+        self._document = document
+        self._ordering = None
+        self._bounds = (None, None)
+        self._slice = slice(None)
+        self._rerun = False
+        self._field_paths = None
+        if query is not None:
+            self._field_paths = query._projection_paths()
+            if query.orders:
+                ordering = self._ordering = _Ordering(query.orders)
+                start = ordering.cursor(*query._start_at) if query._start_at else None
+                end = ordering.cursor(*query._end_at) if query._end_at else None
+                self._bounds = ((ordering.key(*start[:2]), start[2]) if start else None,
+                                (ordering.key(*end[:2]), end[2]) if end else None)
+            else:
+                # Unordered cursors cut the results at a matching document,
+                # which can only be found by running the query again.
+                self._rerun = bool(query._start_at or query._end_at)
+            offset = query._offset or 0
+            self._slice = slice(offset, offset + query._limit if query._limit else None)
+        self._windowed = self._slice != slice(None)
+        # Every matching document in query order, before offset and limit.
+        self._keys = []  # type: List[Any]
+        self._snapshots = []  # type: List[DocumentSnapshot]
+        self._key_by_path = {}  # type: Dict[Tuple[str, ...], Any]
+        self._lock = threading.Lock()
+        self._active = True
+        with self._lock:
+            store.add_watch(self)
+            self._load()
+
+    @property
+    def target(self) -> Tuple[str, Any]:
+        """:returns: ('document'|'collection'|'group', path or collection ID,) to listen on."""
+        if self._document is not None:
+            return 'document', tuple(self._document._path)
+        if self._query.all_descendants:
+            return 'group', self._query.parent.id
+        return 'collection', tuple(self._query.parent._path)
+
+    def unsubscribe(self):
+        with self._lock:
+            if self._active:
+                self._active = False
+                self._store.remove_watch(self)
+
+    def _load(self):
+        self._fill()
+        results = self._results()
+        changes = [DocumentChange(ChangeType.ADDED, snapshot, -1, index)
+                   for index, snapshot in enumerate(results)]
+        self._store.dispatcher.submit(self._callback, results, changes, self._read_time())
+
+    def on_reset(self):
+        """Run the query again after the whole store was replaced, and report what changed."""
+        with self._lock:
+            if not self._active:
+                return
+            before = self._results()
+            self._keys, self._snapshots, self._key_by_path = [], [], {}
+            self._fill()
+            after = self._results()
+            changes = _diff(before, after)
+            if changes:
+                self._store.dispatcher.submit(self._callback, after, changes, self._read_time())
+
+    def _fill(self):
+        """Insert every document now in the results."""
+        if self._document is not None:
+            snapshots = [self._document._snapshot(*self._store.get_versioned_fields(self._document._path))]
+        else:
+            snapshots = self._query._snapshots() if self._rerun else self._query._filtered_snapshots()
+        for position, snapshot in enumerate(snapshots):
+            # Rerun results are already in order: their position is their key.
+            key = position if self._rerun else self._key(snapshot.reference._path, snapshot._doc)
+            if snapshot.exists and key is not None:
+                self._insert(key, snapshot)
+
+    def on_write(self, path: List[str], fields: Optional[Document], document: Any):
+        """Fold one document write into the results, and report what changed."""
+        with self._lock:
+            if not self._active:
+                return
+            path = tuple(path)
+            if self._rerun:
+                self._reload(path)
+                return
+            old_key = self._key_by_path.get(path)
+            new_key = self._key(path, fields) if fields and self._matches(fields) else None
+            if old_key is None and new_key is None:
+                return
+            old_index = bisect_left(self._keys, old_key) if old_key is not None else -1
+            if new_key is not None and old_key is not None and self._snapshots[old_index]._doc is fields:
+                # Already in the results: the write raced with registration.
+                return
+            before = self._results() if self._windowed else None
+            old_snapshot = self._remove(old_index) if old_key is not None else None
+            snapshot = None
+            new_index = -1
+            if new_key is not None:
+                snapshot = DocumentSnapshot(self._reference(path), fields, self._field_paths,
+                                            document.created, document.version, document.version)
+                new_index = self._insert(new_key, snapshot)
+            if self._windowed:
+                changes = _diff(before, self._results(), path)
+            elif old_snapshot is None:
+                changes = [DocumentChange(ChangeType.ADDED, snapshot, -1, new_index)]
+            elif snapshot is None:
+                changes = [DocumentChange(ChangeType.REMOVED, old_snapshot, old_index, -1)]
+            else:
+                changes = [DocumentChange(ChangeType.MODIFIED, snapshot, old_index, new_index)]
+            if changes:
+                self._store.dispatcher.submit(self._callback, self._results(), changes, self._read_time())
+
+    def _reload(self, path: Tuple[str, ...]):
+        before = self._results()
+        self._keys, self._snapshots, self._key_by_path = [], [], {}
+        for position, snapshot in enumerate(self._query._snapshots()):
+            self._insert(position, snapshot)
+        after = self._results()
+        changes = _diff(before, after, path)
+        if changes:
+            self._store.dispatcher.submit(self._callback, after, changes, self._read_time())
+
+    def _matches(self, fields: Document) -> bool:
+        if self._query is None:
+            return True
+        try:
+            return self._query._matches(fields)
+        except TypeError:
+            # Values the filter cannot compare never match.
+            return False
+
+    def _key(self, path: Tuple[str, ...], fields: Document) -> Any:
+        """The sort key of a document in the results, or None if it is out of the cursors' bounds."""
+        path = tuple(path)
+        if self._ordering is None:
+            return path
+        values = self._ordering.document_values(fields)
+        if values is None:
+            return None
+        key = self._ordering.key(values, path)
+        if not self._ordering.within(key, *self._bounds):
+            return None
+        return _Descending(key) if self._ordering.sort_reverse else key
+
+    def _insert(self, key: Any, snapshot: DocumentSnapshot) -> int:
+        index = bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self._snapshots.insert(index, snapshot)
+        self._key_by_path[tuple(snapshot.reference._path)] = key
+        return index
+
+    def _remove(self, index: int) -> DocumentSnapshot:
+        del self._keys[index]
+        snapshot = self._snapshots.pop(index)
+        del self._key_by_path[tuple(snapshot.reference._path)]
+        return snapshot
+
+    def _results(self) -> List[DocumentSnapshot]:
+        return self._snapshots[self._slice]
+
+    def _read_time(self) -> Timestamp:
+        return Timestamp.from_nanoseconds(self._store.read_time())
+
+    def _reference(self, path: Tuple[str, ...]) -> Any:
+        if self._document is not None:
+            return self._document
+        parent = self._query.parent
+        if self._query.all_descendants:
+            parent = get_collection_reference(self._store, list(path[:-1]), type(parent))
+        return parent.document(path[-1])
+
+
+def _diff(before: List[DocumentSnapshot], after: List[DocumentSnapshot],
+          written: Optional[Tuple[str, ...]] = None) -> List[DocumentChange]:
+    """
+    The changes between two results after a write to `written`, or to any
+    document when None. Other documents can only move in or out of a
+    window, so they are reported as added or removed.
+    """
+    old_positions = {tuple(snapshot.reference._path): index for index, snapshot in enumerate(before)}
+    new_positions = {tuple(snapshot.reference._path): index for index, snapshot in enumerate(after)}
+    changes = []
+    for path, old_index in old_positions.items():
+        if path not in new_positions:
+            changes.append(DocumentChange(ChangeType.REMOVED, before[old_index], old_index, -1))
+    for path, new_index in new_positions.items():
+        old_index = old_positions.get(path)
+        if old_index is None:
+            changes.append(DocumentChange(ChangeType.ADDED, after[new_index], -1, new_index))
+        elif (written is None or path == written) and (old_index != new_index
+                                  or before[old_index]._doc is not after[new_index]._doc):
+            changes.append(DocumentChange(ChangeType.MODIFIED, after[new_index], old_index, new_index))
+    return changes
@@ -1,14 +1,38 @@
-from typing import Dict, Any
-from mockfirestore.document import DocumentReference
-from mockfirestore._helpers import get_by_path, set_by_path, delete_by_path
-from mockfirestore.exceptions import NotFound
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Dict, Any, List, Optional, Tuple
+from mockfirestore import AlreadyExists
+from mockfirestore._helpers import Timestamp
+from mockfirestore.document import DocumentReference, WriteOption, _updated_fields, _written_fields
+
+
+class WriteResult:
+    def __init__(self, update_time: int = 0):
+        # The write's time in nanoseconds, when known.
+        if update_time:
+            self.update_time = Timestamp.from_nanoseconds(update_time)
+        else:
+            self.update_time = Timestamp.from_now()
 
 
 class WriteBatch:
+    """
+    Writes committed together. A commit checks every operation before any is
+    applied, so one that fails (an update of a missing document, a create of
+    an existing one) leaves the store untouched. Operations on the same
+    document are folded into one write of its final fields.
+    """
+
     def __init__(self, mock_firestore):
         self._mock_firestore = mock_firestore
         self._operations = []
 
+    def create(self, document_reference: DocumentReference, data: Dict[str, Any]):
+        self._operations.append(
+            {"type": "create", "ref": document_reference, "data": data}
+        )
+        return self
+
     def set(
         self,
         document_reference: DocumentReference,
@@ -20,48 +44,61 @@ class WriteBatch:
         )
         return self
 
-    def update(self, document_reference: DocumentReference, data: Dict[str, Any]):
+    def update(self, document_reference: DocumentReference, data: Dict[str, Any],
+               option: Optional[WriteOption] = None):
         self._operations.append(
-            {"type": "update", "ref": document_reference, "data": data}
+            {"type": "update", "ref": document_reference, "data": data, "option": option}
         )
         return self
 
-    def delete(self, document_reference: DocumentReference):
-        self._operations.append({"type": "delete", "ref": document_reference})
+    def delete(self, document_reference: DocumentReference, option: Optional[WriteOption] = None):
+        self._operations.append({"type": "delete", "ref": document_reference, "option": option})
         return self
 
-    def commit(self):
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def commit(self) -> List[WriteResult]:
+        store = self._mock_firestore._store
+        with store.locked(self._paths()):
+            results = self._apply(store)
+        self._operations.clear()
+        return results
+
+    def _paths(self) -> List[List[str]]:
+        return [operation["ref"]._path for operation in self._operations]
+
+    def _apply(self, store) -> List[WriteResult]:
+        """Check every operation, then apply them all; the caller holds the documents' locks."""
+        writes = self._final_writes(store)
+        # Deletes store None, marking the document as non-existent.
+        versions = {path: store.set_fields(list(path), fields) for path, fields in writes.items()}
+        return [WriteResult(versions[tuple(operation["ref"]._path)]) for operation in self._operations]
+
+    def _final_writes(self, store) -> Dict[Tuple[str, ...], Optional[dict]]:
+        """
+        :returns: the fields to store for each written document, in the order
+        they were first written, or None for deletes.
+        :raises: what the first invalid operation would, before anything is written.
+        """
+        writes = OrderedDict()  # type: Dict[Tuple[str, ...], Optional[dict]]
         for operation in self._operations:
-            if operation["type"] == "set":
-                if operation["merge"]:
-                    current_data = get_by_path(
-                        self._mock_firestore._data, operation["ref"]._path
-                    )
-                    if current_data:
-                        current_data.update(operation["data"])
-                    else:
-                        set_by_path(
-                            self._mock_firestore._data,
-                            operation["ref"]._path,
-                            operation["data"],
-                        )
-                else:
-                    set_by_path(
-                        self._mock_firestore._data,
-                        operation["ref"]._path,
-                        operation["data"],
-                    )
+            path = tuple(operation["ref"]._path)
+            if path in writes:
+                # Written earlier in the batch: no update time matches it.
+                version, current = None, writes[path]
+            else:
+                version, _, current = store.get_versioned_fields(path)
+            if operation.get("option") is not None:
+                operation["option"].check(version, current, list(path))
+            if operation["type"] == "create":
+                if current:
+                    raise AlreadyExists("Document already exists: {}".format(list(path)))
+                writes[path] = deepcopy(operation["data"])
+            elif operation["type"] == "set":
+                writes[path] = _written_fields(current, operation["data"], operation["merge"])
             elif operation["type"] == "update":
-                current_data = get_by_path(
-                    self._mock_firestore._data, operation["ref"]._path
-                )
-                if current_data:
-                    current_data.update(operation["data"])
-                else:
-                    raise NotFound(
-                        "No document to update: {}".format(operation["ref"]._path)
-                    )
+                writes[path] = _updated_fields(current, operation["data"], list(path))
             elif operation["type"] == "delete":
-                # Ensure the document is marked as non-existent
-                set_by_path(self._mock_firestore._data, operation["ref"]._path, None)
-        self._operations.clear()
+                writes[path] = None
+        return writes
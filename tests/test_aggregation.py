@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from mockfirestore import MockFirestore
+
+
+def values(aggregation_query):
+    (results,) = aggregation_query.get()
+    return {result.alias: result.value for result in results}
+
+
+class TestAggregation(TestCase):
+    def setUp(self):
+        self.fs = MockFirestore()
+        self.fs._data = {'foo': {
+            'first': {'score': 1, 'team': 'a'},
+            'second': {'score': 2.5, 'team': 'b'},
+            'third': {'score': 'n/a', 'team': 'a'},
+            'fourth': {'score': True, 'team': 'a'},
+            'fifth': {'team': 'b', 'bar': {'sub': {'score': 10}}},
+        }}
+
+    def test_aggregation_countCollection(self):
+        self.assertEqual({'field_1': 5}, values(self.fs.collection('foo').count()))
+
+    def test_aggregation_countFollowsWrites(self):
+        collection = self.fs.collection('foo')
+        collection.document('sixth').set({'team': 'c'})
+        collection.document('first').delete()
+        collection.document('second').set({'team': 'b'})
+        collection.document('fifth').delete()
+        batch = self.fs.batch()
+        batch.delete(collection.document('third'))
+        batch.set(collection.document('seventh'), {'team': 'c'})
+        batch.commit()
+        fork = self.fs.fork()
+        fork.collection('foo').document('eighth').set({'team': 'd'})
+        self.assertEqual({'total': 4}, values(collection.count(alias='total')))
+        self.assertEqual({'total': 5}, values(fork.collection('foo').count(alias='total')))
+        self.assertEqual(4, len(list(collection.stream())))
+
+    def test_aggregation_countWithLimitAndOffset(self):
+        self.assertEqual({'field_1': 2}, values(self.fs.collection('foo').limit(2).count()))
+        self.assertEqual({'field_1': 1}, values(self.fs.collection('foo').offset(4).limit(2).count()))
+
+    def test_aggregation_filteredQuery(self):
+        query = self.fs.collection('foo').where('team', '==', 'a')
+        self.assertEqual({'n': 3, 'total': 1, 'mean': 1.0},
+                         values(query.count(alias='n').sum('score', alias='total').avg('score', alias='mean')))
+
+    def test_aggregation_sumAndAvgIgnoreNonNumbers(self):
+        collection = self.fs.collection('foo')
+        self.assertEqual({'field_1': 3.5}, values(collection.sum('score')))
+        self.assertEqual({'field_1': 1.75}, values(collection.avg('score')))
+        self.assertEqual({'field_1': None}, values(collection.avg('team')))
+        self.assertEqual({'field_1': 0}, values(collection.sum('team')))
+
+    def test_aggregation_orderedQuery(self):
+        query = self.fs.collection('foo').order_by('score').limit(2)
+        self.assertEqual({'field_1': 2, 'field_2': 1}, values(query.count().sum('score')))
+
+    def test_aggregation_collectionGroup(self):
+        self.assertEqual({'field_1': 1, 'field_2': 10}, values(self.fs.collection_group('bar').count().sum('score')))
+
+    def test_aggregation_stream(self):
+        results = list(self.fs.collection('foo').count().stream())
+        self.assertEqual([[5]], [[result.value for result in row] for row in results])
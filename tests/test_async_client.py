@@ -0,0 +1,161 @@
+import asyncio
+import sys
+from unittest import TestCase, skipIf
+
+from mockfirestore import Aborted
+
+if sys.version_info >= (3, 6):
+    # The package only has the async client from Python 3.6.
+    from mockfirestore import AsyncMockFirestore, AsyncDocumentReference, AsyncQuery, async_transactional
+    from mockfirestore import async_query
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def ids(stream):
+    # A loop rather than an async comprehension, so the module compiles on 3.5.
+    result = []
+    async for snapshot in stream:
+        result.append(snapshot.id)
+    return result
+
+
+@skipIf(sys.version_info < (3, 6), 'The async client needs Python 3.6')
+class TestAsyncMockFirestore(TestCase):
+    def setUp(self):
+        self.fs = AsyncMockFirestore()
+        self.fs._data = {'foo': {
+            'first': {'id': 1},
+            'second': {'id': 2},
+        }}
+
+    def test_asyncDocument_getSetUpdateDelete(self):
+        async def scenario():
+            doc = self.fs.collection('foo').document('third')
+            await doc.set({'id': 3})
+            await doc.update({'name': 'three'})
+            await doc.set({'extra': True}, merge=True)
+            snapshot = await doc.get()
+            await doc.delete()
+            return snapshot, await doc.get()
+
+        snapshot, deleted = run(scenario())
+        self.assertEqual({'id': 3, 'name': 'three', 'extra': True}, snapshot.to_dict())
+        self.assertIsInstance(snapshot.reference, AsyncDocumentReference)
+        self.assertFalse(deleted.exists)
+
+    def test_asyncCollection_streamAndAdd(self):
+        async def scenario():
+            collection = self.fs.collection('foo')
+            _, reference = await collection.add({'id': 3}, document_id='third')
+            return reference, await ids(collection.stream())
+
+        reference, doc_ids = run(scenario())
+        self.assertIsInstance(reference, AsyncDocumentReference)
+        self.assertEqual(['first', 'second', 'third'], doc_ids)
+
+    def test_asyncQuery_streamAndGet(self):
+        query = self.fs.collection('foo').where('id', '>', 1).order_by('id')
+        self.assertIsInstance(query, AsyncQuery)
+        self.assertEqual(['second'], run(ids(query.stream())))
+        self.assertEqual([{'id': 2}], [doc.to_dict() for doc in run(query.get())])
+
+    def test_asyncQuery_subcollectionsAndGroups(self):
+        async def scenario():
+            await self.fs.document('foo/first/bar/sub').set({'id': 10})
+            await self.fs.collection('foo/second/bar').document('other').set({'id': 11})
+            return await ids(self.fs.collection_group('bar').stream())
+
+        self.assertEqual(['sub', 'other'], run(scenario()))
+
+    def test_asyncQuery_streamYieldsToEventLoop(self):
+        self.fs._data = {'foo': {'doc{:04d}'.format(i): {'id': i}
+                                 for i in range(2 * async_query.STREAM_BATCH_SIZE)}}
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def scenario():
+            task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            before = len(ticks)
+            await ids(self.fs.collection('foo').stream())
+            during = len(ticks) - before
+            task.cancel()
+            return during
+
+        self.assertGreaterEqual(run(scenario()), 1)
+
+    def test_asyncClient_getAll(self):
+        async def scenario():
+            references = [self.fs.collection('foo').document('first'),
+                          self.fs.collection('foo').document('missing')]
+            snapshots = []
+            async for snapshot in self.fs.get_all(references):
+                snapshots.append(snapshot)
+            return snapshots
+
+        snapshots = run(scenario())
+        self.assertEqual({'first': True, 'missing': False},
+                         {snapshot.id: snapshot.exists for snapshot in snapshots})
+
+    def test_asyncBatch_commit(self):
+        async def scenario():
+            async with self.fs.batch() as batch:
+                batch.set(self.fs.collection('foo').document('third'), {'id': 3})
+                batch.delete(self.fs.collection('foo').document('first'))
+            return await ids(self.fs.collection('foo').stream())
+
+        self.assertEqual(['second', 'third'], run(scenario()))
+
+    def test_asyncTransactional_retriesOnConflict(self):
+        doc = self.fs.collection('foo').document('first')
+        attempts = []
+
+        @async_transactional
+        async def increment(transaction, reference):
+            async for snapshot in await transaction.get(reference):
+                value = snapshot.get('id')
+            attempts.append(value)
+            if len(attempts) == 1:
+                await reference.update({'id': 100})
+            transaction.update(reference, {'id': value + 1})
+
+        run(increment(self.fs.transaction(), doc))
+        self.assertEqual([1, 100], attempts)
+        self.assertEqual({'id': 101}, run(doc.get()).to_dict())
+
+    def test_asyncTransaction_commitAbortsOnConflict(self):
+        async def scenario():
+            doc = self.fs.collection('foo').document('first')
+            transaction = self.fs.transaction()
+            await transaction._begin()
+            query = self.fs.collection('foo').where('id', '==', 1)
+            await ids(await transaction.get(query))
+            await doc.update({'id': 5})
+            transaction.set(doc, {'id': 2})
+            await transaction.commit()
+
+        with self.assertRaises(Aborted):
+            run(scenario())
+
+    def test_asyncTransaction_rejectsSyncWith(self):
+        transaction = self.fs.transaction()
+        with self.assertRaises(TypeError):
+            with transaction:
+                pass
+        with self.assertRaises(TypeError):
+            transaction.__exit__(None, None, None)
+
+    def test_asyncAggregation_get(self):
+        (results,) = run(self.fs.collection('foo').where('id', '>', 0).sum('id').get())
+        self.assertEqual([3], [result.value for result in results])
@@ -1,5 +1,5 @@
 import unittest
-from mockfirestore import MockFirestore
+from mockfirestore import MockFirestore, NotFound, AlreadyExists, FailedPrecondition
 
 
 class TestMockFirestoreBatch(unittest.TestCase):
@@ -94,5 +94,79 @@ class TestMockFirestoreBatch(unittest.TestCase):
         self.assertEqual(doc2_ref.get().to_dict(), {"name": "Grace"})
 
 
+    def test_batch_failure_applies_nothing(self):
+        doc1_ref = self.fs.collection("users").document("user10")
+        doc2_ref = self.fs.collection("users").document("missing")
+        doc1_ref.set({"name": "Heidi"})
+
+        batch = self.fs.batch()
+        batch.set(doc1_ref, {"name": "Ivan"})
+        batch.update(doc2_ref, {"name": "Judy"})
+        with self.assertRaises(NotFound):
+            batch.commit()
+
+        self.assertEqual(doc1_ref.get().to_dict(), {"name": "Heidi"})
+        self.assertFalse(doc2_ref.get().exists)
+
+    def test_batch_coalesces_writes_to_one_document(self):
+        doc_ref = self.fs.collection("users").document("user11")
+        batch = self.fs.batch()
+        batch.create(doc_ref, {"name": "Mallory", "age": 1})
+        batch.update(doc_ref, {"age": 2})
+        batch.set(doc_ref, {"city": "Paris"}, merge=True)
+        batch.delete(doc_ref)
+        batch.set(doc_ref, {"name": "Niaj"})
+        batch.update(doc_ref, {"age": 3})
+        versions = []
+        original = self.fs._store.set_fields
+        self.fs._store.set_fields = lambda path, fields: versions.append(fields) or original(path, fields)
+        results = batch.commit()
+
+        self.assertEqual(6, len(results))
+        self.assertEqual([{"name": "Niaj", "age": 3}], versions)
+        self.assertEqual(doc_ref.get().to_dict(), {"name": "Niaj", "age": 3})
+
+    def test_batch_create_existing_document(self):
+        doc_ref = self.fs.collection("users").document("user12")
+        doc_ref.set({"name": "Olivia"})
+        batch = self.fs.batch()
+        batch.create(doc_ref, {"name": "Peggy"})
+        with self.assertRaises(AlreadyExists):
+            batch.commit()
+        self.assertEqual(doc_ref.get().to_dict(), {"name": "Olivia"})
+
+    def test_batch_merge_nested_maps(self):
+        doc_ref = self.fs.collection("users").document("user13")
+        data = {"name": "Rupert", "address": {"city": "Oslo", "zip": "0150"}}
+        doc_ref.set(data)
+        batch = self.fs.batch()
+        batch.set(doc_ref, {"address": {"city": "Bergen"}}, merge=True)
+        batch.commit()
+        data["address"]["zip"] = "changed"
+
+        self.assertEqual(
+            doc_ref.get().to_dict(),
+            {"name": "Rupert", "address": {"city": "Bergen", "zip": "0150"}},
+        )
+
+    def test_batch_last_update_time_precondition(self):
+        doc_ref = self.fs.collection("users").document("user14")
+        doc_ref.set({"name": "Sybil"})
+        option = self.fs.write_option(last_update_time=doc_ref.get().update_time)
+        other_ref = self.fs.collection("users").document("user15")
+        batch = self.fs.batch()
+        batch.set(other_ref, {"name": "Trent"})
+        batch.update(doc_ref, {"age": 30}, option=option)
+        results = batch.commit()
+
+        self.assertEqual(results[1].update_time, doc_ref.get().update_time)
+        batch = self.fs.batch()
+        batch.delete(other_ref)
+        batch.update(doc_ref, {"age": 31}, option=option)
+        with self.assertRaises(FailedPrecondition):
+            batch.commit()
+        self.assertEqual(doc_ref.get().to_dict(), {"name": "Sybil", "age": 30})
+        self.assertTrue(other_ref.get().exists)
+
 if __name__ == "__main__":
     unittest.main()
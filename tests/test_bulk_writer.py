@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from mockfirestore import AlreadyExists, MockFirestore, NotFound
+
+
+class TestBulkWriter(TestCase):
+    def test_bulkWriter_appliesAllWrites(self):
+        fs = MockFirestore()
+        collection = fs.collection('foo')
+        writer = fs.bulk_writer(batch_size=7, max_workers=3)
+        for i in range(100):
+            writer.set(collection.document(str(i)), {'n': i})
+        for i in range(0, 100, 2):
+            writer.update(collection.document(str(i)), {'n': -i})
+        for i in range(0, 100, 10):
+            writer.delete(collection.document(str(i)))
+        writer.close()
+        docs = {doc.id: doc.to_dict()['n'] for doc in collection.stream()}
+        self.assertEqual(90, len(docs))
+        self.assertEqual(-2, docs['2'])
+        self.assertEqual(3, docs['3'])
+        self.assertNotIn('10', docs)
+
+    def test_bulkWriter_reportsFailedWritesOnly(self):
+        fs = MockFirestore()
+        collection = fs.collection('foo')
+        collection.document('exists').set({'n': 0})
+        errors = []
+        results = []
+        writer = fs.bulk_writer(batch_size=10, max_workers=1)
+        writer.on_write_error(lambda reference, error: errors.append((reference.id, type(error))))
+        writer.on_write_result(lambda reference, result: results.append(reference.id))
+        writer.update(collection.document('missing'), {'n': 1})
+        writer.create(collection.document('exists'), {'n': 2})
+        writer.set(collection.document('new'), {'n': 3})
+        writer.flush()
+        self.assertEqual([('missing', NotFound), ('exists', AlreadyExists)], errors)
+        self.assertEqual(['new'], results)
+        self.assertEqual({'n': 3}, collection.document('new').get().to_dict())
+        self.assertEqual({'n': 0}, collection.document('exists').get().to_dict())
+
+    def test_bulkWriter_raisesWithoutErrorCallback(self):
+        fs = MockFirestore()
+        writer = fs.bulk_writer()
+        writer.update(fs.collection('foo').document('missing'), {'n': 1})
+        with self.assertRaises(NotFound):
+            writer.close()
+        with self.assertRaises(ValueError):
+            writer.set(fs.collection('foo').document('other'), {'n': 1})
+
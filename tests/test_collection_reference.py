@@ -211,6 +211,40 @@ class TestCollectionReference(TestCase):
         self.assertIn({'category': 'A', 'status': 'active', 'num': 3}, [d.to_dict() for d in docs_gt_num])
         self.assertIn({'category': 'A', 'status': 'pending', 'num': 4}, [d.to_dict() for d in docs_gt_num])
 
+    def test_collection_where_with_composite_filters(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'category': 'A', 'num': 1},
+            'second': {'category': 'B', 'num': 2},
+            'third': {'category': 'A', 'num': 3},
+            'fourth': {'category': 'C', 'num': 4}
+        }}
+
+        # Define helper classes to mimic FieldFilter, Or and And
+        class MockFieldFilter:
+            def __init__(self, field_path, op_string, value):
+                self.field_path = field_path
+                self.op_string = op_string
+                self.value = value
+
+        class Or:
+            def __init__(self, filters):
+                self.filters = filters
+
+        class And(Or):
+            pass
+
+        either = Or([MockFieldFilter('category', '==', 'B'), MockFieldFilter('num', '>', 3)])
+        docs = list(fs.collection('foo').where(filter=either).stream())
+        self.assertEqual(['fourth', 'second'], [doc.id for doc in docs])
+
+        nested = Or([
+            And([MockFieldFilter('category', '==', 'A'), MockFieldFilter('num', '>', 1)]),
+            MockFieldFilter('category', '==', 'C'),
+        ])
+        docs = list(fs.collection('foo').where('num', '<', 4).where(filter=nested).stream())
+        self.assertEqual(['third'], [doc.id for doc in docs])
+
     def test_collection_whereNestedField(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -222,6 +256,30 @@ class TestCollectionReference(TestCase):
         self.assertEqual(len(docs), 1)
         self.assertEqual({'nested': {'a': 1}}, docs[0].to_dict())
 
+    def test_collection_whereNestedFieldMissingOrNotMap(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'nested': {'a': 1}},
+            'second': {'nested': 'flat'},
+            'third': {'other': 1},
+        }}
+
+        docs = list(fs.collection('foo').where('nested.a', '==', 1).stream())
+        self.assertEqual(['first'], [doc.id for doc in docs])
+
+    def test_collection_whereSameShapeDifferentValues(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'a': 1, 'b': 'x'},
+            'second': {'a': 2, 'b': 'x'},
+            'third': {'a': 2, 'b': 'y'},
+        }}
+
+        collection = fs.collection('foo')
+        self.assertEqual(['second'], [doc.id for doc in collection.where('a', '==', 2).where('b', '==', 'x').stream()])
+        self.assertEqual(['third'], [doc.id for doc in collection.where('a', '==', 2).where('b', '==', 'y').stream()])
+        self.assertEqual([], [doc.id for doc in collection.where('a', '==', 1).where('b', '==', 'y').stream()])
+
     def test_collection_whereIn(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -261,6 +319,83 @@ class TestCollectionReference(TestCase):
         self.assertEqual({'field': ['val4']}, contains_any_docs[0].to_dict())
         self.assertEqual({'field': ['val3', 'val2', 'val1']}, contains_any_docs[1].to_dict())
 
+    def test_collection_whereArrayContainsHyphenated(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'field': ['val4']},
+            'second': {'field': ['val3', 'val2']},
+            'third': {'field': 'val3'}
+        }}
+
+        contains_docs = list(fs.collection('foo').where('field', 'array-contains', 'val3').stream())
+        self.assertEqual(['second'], [doc.id for doc in contains_docs])
+        contains_any_docs = list(fs.collection('foo').where('field', 'array-contains-any', ['val3', 'val4']).stream())
+        self.assertEqual(['first', 'second'], [doc.id for doc in contains_any_docs])
+
+    def test_collection_whereNotEqual(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'valid': True},
+            'second': {'valid': False},
+            'third': {'valid': None},
+            'fourth': {'other': True}
+        }}
+
+        docs = list(fs.collection('foo').where('valid', '!=', True).stream())
+        self.assertEqual(['second', 'third'], [doc.id for doc in docs])
+
+    def test_collection_whereNotIn(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'field': 'val1'},
+            'second': {'field': 'val2'},
+            'third': {'field': ['val1']},
+            'fourth': {'other': 'val1'}
+        }}
+
+        docs = list(fs.collection('foo').where('field', 'not-in', ['val1', 'val3']).stream())
+        self.assertEqual(['second', 'third'], [doc.id for doc in docs])
+        docs = list(fs.collection('foo').where('field', 'not_in', [['val1'], 'val2']).stream())
+        self.assertEqual(['first'], [doc.id for doc in docs])
+
+    def test_collection_whereInManyValues(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {str(i): {'n': i, 'pair': [i, i]} for i in range(100)}}
+
+        docs = list(fs.collection('foo').where('n', 'in', list(range(0, 1000, 7))).stream())
+        self.assertEqual(sorted(str(i) for i in range(0, 100, 7)), [doc.id for doc in docs])
+        docs = list(fs.collection('foo').where('pair', 'in', [[3, 3], [5, 4]]).stream())
+        self.assertEqual(['3'], [doc.id for doc in docs])
+
+    def test_collection_select(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'name': 'a', 'num': 1, 'blob': {'x': [1, 2], 'y': 'z'}},
+            'second': {'name': 'b', 'num': 2},
+        }}
+
+        docs = list(fs.collection('foo').select(['name', 'blob.x']).stream())
+        self.assertEqual({'name': 'a', 'blob': {'x': [1, 2]}}, docs[0].to_dict())
+        self.assertEqual({'name': 'b'}, docs[1].to_dict())
+        self.assertEqual('a', docs[0].get('name'))
+        with self.assertRaises(KeyError):
+            docs[0].get('num')
+        docs[0].to_dict()['blob']['x'].append(3)
+        self.assertEqual([1, 2], fs.collection('foo').document('first').get().to_dict()['blob']['x'])
+
+    def test_collection_select_withQuery(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'name': 'a', 'num': 1},
+            'second': {'name': 'b', 'num': 2},
+        }}
+
+        docs = list(fs.collection('foo').where('num', '>', 1).order_by('num').select(['name']).stream())
+        self.assertEqual([{'name': 'b'}], [doc.to_dict() for doc in docs])
+        docs = list(fs.collection('foo').select([]).stream())
+        self.assertEqual([True, True], [doc.exists for doc in docs])
+        self.assertEqual([{}, {}], [doc.to_dict() for doc in docs])
+
     def test_collection_orderBy(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -285,6 +420,44 @@ class TestCollectionReference(TestCase):
         self.assertEqual({'order': 2}, docs[1].to_dict())
         self.assertEqual({'order': 1}, docs[2].to_dict())
 
+    def test_collection_orderBy_multipleFields(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'group': 2, 'order': 1},
+            'second': {'group': 1, 'order': 2},
+            'third': {'group': 1, 'order': 1},
+            'fourth': {'group': 2, 'order': 1},
+        }}
+
+        docs = list(fs.collection('foo').order_by('group')
+                    .order_by('order', direction='DESCENDING').stream())
+        self.assertEqual(['second', 'third', 'fourth', 'first'], [doc.id for doc in docs])
+
+    def test_collection_orderBy_mixedTypes(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'a': {'value': 'text'},
+            'b': {'value': 2.5},
+            'c': {'value': None},
+            'd': {'value': True},
+            'e': {'value': [1]},
+            'f': {'value': 1},
+            'g': {'other': 0},
+        }}
+
+        docs = list(fs.collection('foo').order_by('value').stream())
+        self.assertEqual(['c', 'd', 'f', 'b', 'a', 'e'], [doc.id for doc in docs])
+
+    def test_collection_orderBy_descending_limit(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'doc{}'.format(i): {'order': i % 4} for i in range(10)
+        }}
+
+        docs = list(fs.collection('foo').order_by('order', direction='DESCENDING')
+                    .offset(1).limit(3).stream())
+        self.assertEqual(['doc3', 'doc6', 'doc2'], [doc.id for doc in docs])
+
     def test_collection_limit(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -295,6 +468,42 @@ class TestCollectionReference(TestCase):
         self.assertEqual({'id': 1}, docs[0].to_dict())
         self.assertEqual(1, len(docs))
 
+    def test_collection_where_limit_stopsReadingOnceSatisfied(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'count': 1},
+            'second': {'count': 2},
+            'third': {'count': 'not comparable to an int'},
+        }}
+        docs = list(fs.collection('foo').where('count', '<', 5).limit(2).stream())
+        self.assertEqual([{'count': 1}, {'count': 2}], [doc.to_dict() for doc in docs])
+
+    def test_collection_stream_keepsIdOrderThroughWrites(self):
+        fs = MockFirestore()
+        for doc_id in ['m', 'c', 'x', 'a']:
+            fs.collection('foo').document(doc_id).set({'id': doc_id})
+        fs.collection('foo').document('c').delete()
+        fs.bulk_load('foo', [('b', {'id': 'b'}), ('z', {'id': 'z'}), ('m', {'id': 'm'})])
+        fork = fs.fork()
+        fork.collection('foo').document('n').set({'id': 'n'})
+        self.assertEqual(['a', 'b', 'm', 'x', 'z'],
+                         [doc.id for doc in fs.collection('foo').stream()])
+        self.assertEqual(['a', 'b', 'm', 'n', 'x', 'z'],
+                         [doc.id for doc in fork.collection('foo').stream()])
+        docs = fork.collection('foo').where('id', '>', 'b').limit(2).stream()
+        self.assertEqual(['m', 'n'], [doc.id for doc in docs])
+
+    def test_collection_stream_seesWritesAheadOfTheScanOnce(self):
+        fs = MockFirestore()
+        for doc_id in ['b', 'd', 'f']:
+            fs.collection('foo').document(doc_id).set({'id': doc_id})
+        docs = fs.collection('foo').where('id', '>=', '').stream()
+        self.assertEqual('b', next(docs).id)
+        fs.collection('foo').document('a').set({'id': 'a'})
+        fs.collection('foo').document('e').set({'id': 'e'})
+        fs.collection('foo').document('d').delete()
+        self.assertEqual(['e', 'f'], [doc.id for doc in docs])
+
     def test_collection_offset(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -496,6 +705,59 @@ class TestCollectionReference(TestCase):
         self.assertEqual({'id': 3}, docs[2].to_dict())
         self.assertEqual({'id': 4}, docs[3].to_dict())
 
+    def test_collection_cursor_values(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1},
+            'second': {'id': 2},
+            'third': {'id': 3},
+            'fourth': {'id': 4},
+        }}
+        collection = fs.collection('foo')
+        docs = list(collection.order_by('id').start_after([1]).end_before([4]).stream())
+        self.assertEqual(['second', 'third'], [doc.id for doc in docs])
+
+        docs = list(collection.order_by('id', direction='DESCENDING').start_at({'id': 3}).limit(2).stream())
+        self.assertEqual(['third', 'second'], [doc.id for doc in docs])
+
+    def test_collection_cursor_valueBetweenDocuments(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 10},
+            'second': {'id': 20},
+            'third': {'id': 30},
+        }}
+        docs = list(fs.collection('foo').order_by('id').start_at([15]).end_at([30]).stream())
+        self.assertEqual(['second', 'third'], [doc.id for doc in docs])
+
+    def test_collection_cursor_missingOrderByValue(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1},
+        }}
+        with self.assertRaises(ValueError):
+            list(fs.collection('foo').order_by('id').start_at({'other': 1}).stream())
+
+    def test_collection_cursor_sortedIndexPagination(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'doc{:02d}'.format(i): {'order': i // 2} for i in range(20)
+        }}
+        fs.create_index('foo', 'order', kind='sorted')
+        query = fs.collection('foo').order_by('order')
+
+        pages = []
+        page = list(query.limit(6).stream())
+        while page:
+            pages.append([doc.id for doc in page])
+            page = list(fs.collection('foo').order_by('order').start_after(page[-1]).limit(6).stream())
+        self.assertEqual(sorted(fs._data['foo']), [doc_id for page in pages for doc_id in page])
+        self.assertEqual(['doc06', 'doc07', 'doc08', 'doc09', 'doc10', 'doc11'], pages[1])
+
+        docs = list(fs.collection('foo').order_by('order', direction='DESCENDING')
+                    .start_after({'order': 8}).end_at({'order': 7}).stream())
+        self.assertEqual(['doc15', 'doc14'], [doc.id for doc in docs])
+
     def test_collection_limitAndOrderBy(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -1,8 +1,9 @@
+from threading import Thread
 from unittest import TestCase
 
 from google.cloud import firestore
 
-from mockfirestore import MockFirestore, NotFound
+from mockfirestore import FailedPrecondition, MockFirestore, NotFound
 
 
 class TestDocumentReference(TestCase):
@@ -96,6 +97,30 @@ class TestDocumentReference(TestCase):
         doc = fs.collection('foo').document('bar').get().to_dict()
         self.assertEqual(doc_content, doc)
 
+    def test_document_get_excludesSubcollections(self):
+        fs = MockFirestore()
+        doc_ref = fs.collection('foo').document('first')
+        doc_ref.set({'id': 1})
+        doc_ref.collection('bar').document('nested').set({'id': 1.1})
+
+        self.assertEqual({'id': 1}, doc_ref.get().to_dict())
+        nested = fs.document('foo/first/bar/nested').get()
+        self.assertEqual({'id': 1.1}, nested.to_dict())
+
+    def test_document_get_parentOfSubcollectionDoesNotExist(self):
+        fs = MockFirestore()
+        fs.document('foo/first/bar/nested').set({'id': 1.1})
+        self.assertFalse(fs.document('foo/first').get().exists)
+
+    def test_document_delete_keepsSubcollections(self):
+        fs = MockFirestore()
+        fs.document('foo/first').set({'id': 1})
+        fs.document('foo/first/bar/nested').set({'id': 1.1})
+        fs.document('foo/first').delete()
+
+        self.assertFalse(fs.document('foo/first').get().exists)
+        self.assertEqual({'id': 1.1}, fs.document('foo/first/bar/nested').get().to_dict())
+
     def test_document_set_mergeNewValue(self):
         fs = MockFirestore()
         fs._data = {'foo': {
@@ -105,6 +130,15 @@ class TestDocumentReference(TestCase):
         doc = fs.collection('foo').document('first').get().to_dict()
         self.assertEqual({'id': 1, 'updated': True}, doc)
 
+    def test_document_set_mergeNestedMaps(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1, 'nested': {'a': 1, 'b': {'c': 2}}}
+        }}
+        fs.collection('foo').document('first').set({'nested': {'b': {'d': 3}}}, merge=True)
+        doc = fs.collection('foo').document('first').get().to_dict()
+        self.assertEqual({'id': 1, 'nested': {'a': 1, 'b': {'c': 2, 'd': 3}}}, doc)
+
     def test_document_set_mergeNewValueForNonExistentDoc(self):
         fs = MockFirestore()
         fs.collection('foo').document('first').set({'updated': True}, merge=True)
@@ -230,6 +264,15 @@ class TestDocumentReference(TestCase):
         document = coll.document('first')
         self.assertIs(document.parent, coll)
 
+    def test_document_equalityByPath(self):
+        fs = MockFirestore()
+        document = fs.collection('foo').document('first')
+        self.assertEqual(document, fs.document('foo/first'))
+        self.assertEqual(hash(document), hash(fs.document('foo/first')))
+        self.assertNotEqual(document, fs.document('foo/second'))
+        self.assertNotEqual(document, MockFirestore().document('foo/first'))
+        self.assertEqual(1, len({document, fs.document('foo/first')}))
+
     def test_document_update_transformerArrayUnionBasic(self):
         fs = MockFirestore()
         fs._data = {"foo": {"first": {"arr": [1, 2]}}}
@@ -266,4 +309,57 @@ class TestDocumentReference(TestCase):
         fs.collection('foo').document('first').update({'arr': firestore.ArrayUnion([1])})
 
         doc = fs.collection('foo').document('first').get().to_dict()
-        self.assertEqual(doc, {'arr': [1], 'spicy': 'tuna'})
\ No newline at end of file
+        self.assertEqual(doc, {'arr': [1], 'spicy': 'tuna'})
+
+    def test_document_update_transformerArrayRemove(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'arr': [1, 2, 1, 3], 'nested': {'arr': [1]}, 'text': 'x'}
+        }}
+        fs.collection('foo').document('first').update({
+            'arr': firestore.ArrayRemove([1, 4]),
+            'nested': {'arr': firestore.ArrayRemove([1])},
+            'text': firestore.ArrayRemove([1]),
+            'missing': firestore.ArrayRemove([1]),
+        })
+
+        doc = fs.collection('foo').document('first').get().to_dict()
+        self.assertEqual({'arr': [2, 3], 'nested': {'arr': []}, 'text': [], 'missing': []}, doc)
+
+    def test_document_update_concurrentIncrements(self):
+        fs = MockFirestore()
+        doc = fs.collection('foo').document('first')
+        doc.set({'count': 0})
+
+        def worker():
+            for _ in range(200):
+                doc.update({'count': firestore.Increment(1)})
+
+        threads = [Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({'count': 1600}, doc.get().to_dict())
+
+    def test_document_update_lastUpdateTimePrecondition(self):
+        fs = MockFirestore()
+        doc_ref = fs.collection('foo').document('first')
+        doc_ref.set({'id': 1})
+        option = fs.write_option(last_update_time=doc_ref.get().update_time)
+        doc_ref.update({'id': 2}, option=option)
+        self.assertEqual({'id': 2}, doc_ref.get().to_dict())
+        with self.assertRaises(FailedPrecondition):
+            doc_ref.update({'id': 3}, option=option)
+        with self.assertRaises(FailedPrecondition):
+            doc_ref.delete(option=option)
+        self.assertEqual({'id': 2}, doc_ref.get().to_dict())
+
+    def test_document_delete_existsPrecondition(self):
+        fs = MockFirestore()
+        doc_ref = fs.collection('foo').document('first')
+        with self.assertRaises(FailedPrecondition):
+            doc_ref.delete(option=fs.write_option(exists=True))
+        doc_ref.set({'id': 1})
+        doc_ref.delete(option=fs.write_option(exists=True))
+        self.assertFalse(doc_ref.get().exists)
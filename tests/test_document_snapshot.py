@@ -17,9 +17,14 @@ class TestDocumentSnapshot(TestCase):
         fs._data = {'foo': {
             'first': {'id': 1}
         }}
-        doc_dict = fs.collection('foo').document('first').get().to_dict()
-        fs._data['foo']['first']['id'] = 2
+        doc_ref = fs.collection('foo').document('first')
+        doc = doc_ref.get()
+        doc_dict = doc.to_dict()
+        doc_ref.update({'id': 2})
         self.assertEqual({'id': 1}, doc_dict)
+        self.assertEqual({'id': 1}, doc.to_dict())
+        doc_dict['id'] = 3
+        self.assertEqual({'id': 2}, doc_ref.get().to_dict())
 
     def test_documentSnapshot_exists(self):
         fs = MockFirestore()
@@ -116,7 +121,62 @@ class TestDocumentSnapshot(TestCase):
                 'email': 'email@test.com'
             }}
         }}
+        doc_ref = fs.collection('foo').document('first')
+        doc = doc_ref.get()
+        doc.get('contact')['email'] = 'other@test.com'
+        self.assertEqual({'email': 'email@test.com'}, doc.get('contact'))
+        self.assertEqual({'email': 'email@test.com'}, doc_ref.get().get('contact'))
+        doc_ref.update({'contact': {'email': 'new@test.com'}})
+        self.assertEqual({'email': 'email@test.com'}, doc.get('contact'))
+
+    def test_documentSnapshot_isolatedFromLaterWrites(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1, 'contact': {'email': 'email@test.com'}}
+        }}
+        doc_ref = fs.collection('foo').document('first')
+        doc = doc_ref.get()
+        doc_ref.update({'id': 2})
+        doc_ref.set({'contact': {'email': 'other@test.com'}}, merge=True)
+        self.assertEqual(1, doc.get('id'))
+        self.assertEqual({'id': 1, 'contact': {'email': 'email@test.com'}}, doc.to_dict())
+
+    def test_documentSnapshot_toDict_copiesOnce(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1}
+        }}
+        doc_ref = fs.collection('foo').document('first')
+        doc = doc_ref.get()
+        doc_dict = doc.to_dict()
+        doc_dict['id'] = 2
+        self.assertIs(doc_dict, doc.to_dict())
+        self.assertEqual({'id': 1}, doc_ref.get().to_dict())
+
+    def test_documentSnapshot_times_trackWrites(self):
+        fs = MockFirestore()
+        doc_ref = fs.collection('foo').document('first')
+        doc_ref.set({'id': 1})
+        first = doc_ref.get()
+        doc_ref.update({'id': 2})
+        second = doc_ref.get()
+        self.assertEqual(first.create_time, first.update_time)
+        self.assertEqual(first.create_time, second.create_time)
+        self.assertGreater(second.update_time.nanoseconds, first.update_time.nanoseconds)
+        self.assertGreaterEqual(second.read_time.nanoseconds, second.update_time.nanoseconds)
+        self.assertEqual(second.update_time, next(fs.collection('foo').stream()).update_time)
+
+    def test_documentSnapshot_times_documentDoesNotExist(self):
+        fs = MockFirestore()
         doc = fs.collection('foo').document('first').get()
-        self.assertIsNot(
-            doc.get('contact'),fs._data['foo']['first']['contact']
-        )
+        self.assertIsNone(doc.create_time)
+        self.assertIsNone(doc.update_time)
+        self.assertIsNotNone(doc.read_time)
+
+    def test_documentSnapshot_times_neverRepeat(self):
+        fs = MockFirestore()
+        collection = fs.collection('foo')
+        for i in range(1000):
+            collection.document(str(i)).set({'id': i})
+        times = {doc.update_time.nanoseconds for doc in collection.stream()}
+        self.assertEqual(1000, len(times))
@@ -0,0 +1,223 @@
+from datetime import datetime, timezone
+from threading import Thread
+from unittest import TestCase
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter, Or
+
+from mockfirestore import MockFirestore, Timestamp
+
+
+class TestIndex(TestCase):
+    def setUp(self):
+        self.fs = MockFirestore()
+        self.fs._data = {'foo': {
+            'first': {'status': 'open', 'count': 1},
+            'second': {'status': 'closed', 'count': 5},
+            'third': {'status': 'open', 'count': 3},
+            'fourth': {'count': 'many'},
+        }}
+
+    def test_index_whereEquals(self):
+        self.fs.create_index('foo', 'status')
+        docs = list(self.fs.collection('foo').where('status', '==', 'open').stream())
+        self.assertEqual(['first', 'third'], [doc.id for doc in docs])
+
+    def test_index_whereIn(self):
+        self.fs.create_index('foo', 'status')
+        docs = list(self.fs.collection('foo').where('status', 'in', ['closed', 'pending']).stream())
+        self.assertEqual(['second'], [doc.id for doc in docs])
+
+    def test_index_whereRange(self):
+        self.fs.create_index('foo', 'count', kind='sorted')
+        collection = self.fs.collection('foo')
+        self.assertEqual(['first'], [doc.id for doc in collection.where('count', '<', 3).stream()])
+        self.assertEqual(['first', 'third'], [doc.id for doc in collection.where('count', '<=', 3).stream()])
+        self.assertEqual(['second'], [doc.id for doc in collection.where('count', '>', 3).stream()])
+        self.assertEqual(['second', 'third'], [doc.id for doc in collection.where('count', '>=', 3).stream()])
+
+    def test_index_rangeOnlyMatchesSameType(self):
+        self.fs.create_index('foo', 'count', kind='sorted')
+        docs = list(self.fs.collection('foo').where('count', '>=', 'a').stream())
+        self.assertEqual(['fourth'], [doc.id for doc in docs])
+
+    def test_index_rangeSameResultsWithoutIndex(self):
+        self.fs._data = {'foo': {
+            'first': {'x': 1},
+            'second': {'x': 'one'},
+            'third': {'y': 1},
+            'fourth': {'x': None},
+            'fifth': {'x': float('nan')},
+            'sixth': {'x': True},
+            'seventh': {'x': Timestamp(seconds=10)},
+            'eighth': {'x': datetime(1970, 1, 1, 0, 0, 20, tzinfo=timezone.utc)},
+        }}
+        queries = [('>', 0), ('<=', 1), ('<', 'z'), ('>', False),
+                   ('>', Timestamp(seconds=5)), ('<', datetime(1970, 1, 1, 0, 0, 15, tzinfo=timezone.utc))]
+        expected = [['first'], ['first'], ['second'], ['sixth'],
+                    ['eighth', 'seventh'], ['seventh']]
+
+        def run():
+            collection = self.fs.collection('foo')
+            return [sorted(doc.id for doc in collection.where(filter=FieldFilter('x', op, value)).stream())
+                    for op, value in queries]
+
+        self.assertEqual(expected, run())
+        self.fs.create_index('foo', 'x', kind='sorted')
+        self.assertEqual(expected, run())
+
+    def test_index_equalitySameResultsWithoutIndex(self):
+        self.fs._data = {'foo': {
+            'first': {'x': None},
+            'second': {'y': 1},
+            'third': {'x': {'y': None}},
+            'fourth': {'x': 1},
+        }}
+        filters = [FieldFilter('x', '==', None), FieldFilter('x', 'in', [None, 1]),
+                   FieldFilter('x.y', '==', None), FieldFilter('x', '!=', None)]
+        expected = [['first'], ['first', 'fourth'], ['third'], ['fourth', 'third']]
+
+        def run():
+            collection = self.fs.collection('foo')
+            return [sorted(doc.id for doc in collection.where(filter=field_filter).stream())
+                    for field_filter in filters]
+
+        self.assertEqual(expected, run())
+        self.fs.create_index('foo', 'x')
+        self.fs.create_index('foo', 'x.y')
+        self.assertEqual(expected, run())
+
+    def test_index_equalityKeepsBooleansApartFromNumbers(self):
+        self.fs._data = {'foo': {
+            'first': {'x': True, 'tags': [True]},
+            'second': {'x': 1, 'tags': [1.0]},
+            'third': {'x': 1.0, 'tags': [[1]]},
+            'fourth': {'x': [True], 'tags': [[True]]},
+        }}
+        filters = [FieldFilter('x', '==', 1), FieldFilter('x', '==', True),
+                   FieldFilter('x', 'in', [True, 2]), FieldFilter('x', 'not-in', [1]),
+                   FieldFilter('x', '==', [1]), FieldFilter('x', '>=', 1),
+                   FieldFilter('tags', 'array_contains', 1), FieldFilter('tags', 'array_contains', [True]),
+                   FieldFilter('tags', 'array_contains_any', [False, 1])]
+        expected = [['second', 'third'], ['first'], ['first'], ['first', 'fourth'],
+                    [], ['second', 'third'], ['second'], ['fourth'], ['second']]
+
+        def run():
+            collection = self.fs.collection('foo')
+            return [sorted(doc.id for doc in collection.where(filter=field_filter).stream())
+                    for field_filter in filters]
+
+        self.assertEqual(expected, run())
+        self.fs.create_index('foo', 'x')
+        self.fs.create_index('foo', 'x', kind='sorted')
+        self.fs.create_index('foo', 'tags', kind='array')
+        self.assertEqual(expected, run())
+
+    def test_index_combinedWithUnindexedFilter(self):
+        self.fs.create_index('foo', 'status')
+        docs = list(self.fs.collection('foo')
+                    .where('status', '==', 'open').where('count', '>', 1).stream())
+        self.assertEqual(['third'], [doc.id for doc in docs])
+
+    def test_index_orFilterUnion(self):
+        self.fs.create_index('foo', 'status')
+        self.fs.create_index('foo', 'count', kind='sorted')
+        either = Or(filters=[FieldFilter('status', '==', 'open'), FieldFilter('count', '>=', 3)])
+        docs = list(self.fs.collection('foo').where(filter=either).stream())
+        self.assertEqual(['first', 'second', 'third'], [doc.id for doc in docs])
+
+    def test_index_orFilterWithUnindexedBranch(self):
+        self.fs.create_index('foo', 'status')
+        either = Or(filters=[FieldFilter('status', '==', 'closed'), FieldFilter('count', '==', 'many')])
+        docs = list(self.fs.collection('foo').where(filter=either).stream())
+        self.assertEqual(['fourth', 'second'], [doc.id for doc in docs])
+
+    def test_index_arrayContains(self):
+        collection = self.fs.collection('foo')
+        collection.document('first').update({'tags': ['a', 'b', 'a']})
+        collection.document('second').update({'tags': ['b', {'c': 1}]})
+        collection.document('third').update({'tags': 'a'})
+        self.fs.create_index('foo', 'tags', kind='array')
+        self.assertEqual(['first'], [doc.id for doc in collection.where('tags', 'array_contains', 'a').stream()])
+        docs = list(collection.where('tags', 'array-contains-any', ['a', 'b']).stream())
+        self.assertEqual(['first', 'second'], [doc.id for doc in docs])
+        docs = list(collection.where('tags', 'array_contains', {'c': 1}).stream())
+        self.assertEqual(['second'], [doc.id for doc in docs])
+
+    def test_index_arrayFollowsWrites(self):
+        self.fs.create_index('foo', 'tags', kind='array')
+        collection = self.fs.collection('foo')
+        collection.document('first').set({'tags': ['a', 'a']})
+        collection.document('second').set({'tags': ['a']})
+        collection.document('second').update({'tags': firestore.ArrayUnion(['b'])})
+        collection.document('first').update({'tags': firestore.ArrayRemove(['a'])})
+        collection.document('third').set({'tags': ['b']})
+        collection.document('third').delete()
+        self.assertEqual(['second'], [doc.id for doc in collection.where('tags', 'array_contains', 'a').stream()])
+        self.assertEqual(['second'], [doc.id for doc in collection.where('tags', 'array_contains', 'b').stream()])
+        self.assertEqual({'tags': []}, collection.document('first').get().to_dict())
+
+    def test_index_forkSharesNoWrites(self):
+        self.fs.create_index('foo', 'tags', kind='array')
+        collection = self.fs.collection('foo')
+        collection.document('first').set({'tags': ['a', 'b']})
+        collection.document('second').set({'tags': ['a']})
+        fork = self.fs.fork()
+        collection.document('second').delete()
+        collection.document('third').set({'tags': ['b']})
+        fork.collection('foo').document('first').set({'tags': ['c']})
+        self.assertEqual(['first'], [doc.id for doc in collection.where('tags', 'array_contains', 'a').stream()])
+        self.assertEqual(['first', 'third'],
+                         [doc.id for doc in collection.where('tags', 'array_contains', 'b').stream()])
+        forked = fork.collection('foo')
+        self.assertEqual(['second'], [doc.id for doc in forked.where('tags', 'array_contains', 'a').stream()])
+        self.assertEqual([], [doc.id for doc in forked.where('tags', 'array_contains', 'b').stream()])
+
+    def test_index_followsDocumentWrites(self):
+        self.fs.create_index('foo', 'status')
+        collection = self.fs.collection('foo')
+        collection.document('fifth').set({'status': 'open'})
+        collection.document('first').update({'status': 'closed'})
+        collection.document('third').delete()
+        docs = list(collection.where('status', '==', 'open').stream())
+        self.assertEqual(['fifth'], [doc.id for doc in docs])
+
+    def test_index_followsBatchWrites(self):
+        self.fs.create_index('foo', 'count', kind='sorted')
+        collection = self.fs.collection('foo')
+        batch = self.fs.batch()
+        batch.set(collection.document('fifth'), {'count': 10})
+        batch.delete(collection.document('second'))
+        batch.commit()
+        docs = list(collection.where('count', '>', 2).stream())
+        self.assertEqual(['fifth', 'third'], [doc.id for doc in docs])
+
+    def test_index_rebuiltWhenDataReplaced(self):
+        self.fs.create_index('foo', 'status')
+        self.fs._data = {'foo': {'other': {'status': 'open'}}}
+        docs = list(self.fs.collection('foo').where('status', '==', 'open').stream())
+        self.assertEqual(['other'], [doc.id for doc in docs])
+
+    def test_index_unknownKind(self):
+        with self.assertRaises(ValueError):
+            self.fs.create_index('foo', 'status', kind='fulltext')
+
+    def test_index_concurrentWrites(self):
+        self.fs.create_index('bar', 'count', kind='sorted')
+        self.fs.create_index('bar', 'count')
+        collection = self.fs.collection('bar')
+
+        def worker(offset):
+            for i in range(100):
+                collection.document('doc{}'.format(offset + i)).set({'count': offset + i})
+                collection.document('doc{}'.format(offset + i)).update({'count': -(offset + i)})
+
+        threads = [Thread(target=worker, args=(offset,)) for offset in range(0, 800, 100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        docs = list(collection.where('count', '<=', 0).order_by('count').stream())
+        self.assertEqual(800, len(docs))
+        self.assertEqual(['doc799', 'doc798'], [doc.id for doc in docs[:2]])
+        self.assertEqual(['doc5'], [doc.id for doc in collection.where('count', '==', -5).stream()])
@@ -1,3 +1,6 @@
+import json
+from io import StringIO
+from threading import Event, Thread
 from unittest import TestCase
 
 from mockfirestore import MockFirestore
@@ -16,4 +19,237 @@ class TestMockFirestore(TestCase):
         expected_doc_snapshot = doc.get().to_dict()
         self.assertEqual(returned_doc_snapshot, expected_doc_snapshot)
 
+    def test_client_get_all_ordersAndDeduplicates(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'id': 1, 'name': 'a'},
+            'second': {'id': 2, 'name': 'b'}
+        }}
+        references = [fs.document('foo/second'), fs.collection('foo').document('missing'),
+                      fs.collection('foo').document('first'), fs.document('foo/second')]
+        results = list(fs.get_all(references, field_paths=['id']))
+        self.assertEqual(['second', 'missing', 'first'], [snapshot.id for snapshot in results])
+        self.assertEqual([True, False, True], [snapshot.exists for snapshot in results])
+        self.assertEqual({'id': 1}, results[2].to_dict())
+
+    def test_client_data_roundTripsNestedLayout(self):
+        fs = MockFirestore()
+        data = {'foo': {
+            'first': {
+                'id': 1,
+                'contact': {'email': 'email@test.com'},
+                'bar': {'nested': {'id': 1.1}},
+            }
+        }}
+        fs._data = data
+        self.assertEqual({'id': 1, 'contact': {'email': 'email@test.com'}},
+                         fs.document('foo/first').get().to_dict())
+        self.assertEqual({'id': 1.1}, fs.document('foo/first/bar/nested').get().to_dict())
+        self.assertEqual(data, fs._data)
+
+    def test_client_data_isReadOnly(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {'first': {'id': 1, 'tags': ['a']}}}
+        data = fs._data
+        with self.assertRaises(TypeError):
+            data['foo']['first']['id'] = 2
+        with self.assertRaises(TypeError):
+            data['foo']['first']['tags'].append('b')
+        with self.assertRaises(TypeError):
+            del data['foo']
+        fs._data = data
+        self.assertEqual({'id': 1, 'tags': ['a']}, fs.document('foo/first').get().to_dict())
+        fs.document('foo/first').update({'id': 2})
+        self.assertEqual({'id': 2, 'tags': ['a']}, fs.document('foo/first').get().to_dict())
+
+    def test_client_data_readsExplicitSubcollections(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {'first': {
+            'id': 1,
+            '__collections__': {'bar': {'nested': {'id': 1.1}}},
+        }}}
+        self.assertEqual({'id': 1}, fs.document('foo/first').get().to_dict())
+        self.assertEqual({'id': 1.1}, fs.document('foo/first/bar/nested').get().to_dict())
+
+    def test_client_data_keepsMapsOfMapsAsFields(self):
+        fs = MockFirestore()
+        fields = {'address': {'home': {'city': 'x'}}}
+        fs._data = {'users': {'u1': dict(fields, __collections__={})}}
+        self.assertEqual(fields, fs.document('users/u1').get().to_dict())
+        fs.document('users/u2').set(fields)
+        fs.document('users/u2/orders/o1').set({'total': 1})
+        fs._data = fs._data
+        self.assertEqual(fields, fs.document('users/u2').get().to_dict())
+        self.assertEqual({'total': 1}, fs.document('users/u2/orders/o1').get().to_dict())
+        self.assertEqual([], list(fs.collection_group('address').stream()))
+
+    def test_client_collectionGroup(self):
+        fs = MockFirestore()
+        fs._data = {'users': {
+            'alice': {'name': 'Alice', 'orders': {
+                'o1': {'total': 10},
+                'o2': {'total': 30},
+            }},
+            'bob': {'name': 'Bob', 'orders': {
+                'o1': {'total': 20},
+            }},
+        }}
+        fs.document('orders/o9').set({'total': 5})
+        fs.document('users/carol/orders/o1').set({'total': 40})
+
+        docs = list(fs.collection_group('orders').stream())
+        self.assertEqual(
+            ['orders/o9', 'users/alice/orders/o1', 'users/alice/orders/o2',
+             'users/bob/orders/o1', 'users/carol/orders/o1'],
+            ['/'.join(doc.reference._path) for doc in docs])
+        self.assertEqual('bob', docs[3].reference.parent.parent.id)
+
+        docs = list(fs.collection_group('orders').where('total', '>', 15)
+                    .order_by('total', direction='DESCENDING').limit(2).stream())
+        self.assertEqual([40, 30], [doc.get('total') for doc in docs])
+
+    def test_client_collectionGroup_invalidId(self):
+        fs = MockFirestore()
+        with self.assertRaises(ValueError):
+            fs.collection_group('users/orders')
+
+    def test_client_fork_isolatesBothSides(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {'first': {'id': 1, 'bar': {'sub': {'id': 10}}}}}
+        fork = fs.fork()
+        fork.collection('foo').document('first').update({'id': 2})
+        fork.collection('foo/first/bar').document('other').set({'id': 11})
+        fs.collection('foo').document('second').set({'id': 3})
+        self.assertEqual({'id': 1}, fs.collection('foo').document('first').get().to_dict())
+        self.assertEqual(['sub'], [doc.id for doc in fs.collection('foo/first/bar').stream()])
+        self.assertEqual({'id': 2}, fork.collection('foo').document('first').get().to_dict())
+        self.assertFalse(fork.collection('foo').document('second').get().exists)
+
+    def test_client_fork_duringWritesStaysUnchanged(self):
+        fs = MockFirestore()
+        stop = Event()
+
+        def writer(doc_id):
+            doc = fs.collection('foo').document(doc_id)
+            n = 0
+            while not stop.is_set():
+                n += 1
+                doc.set({'n': n})
+
+        threads = [Thread(target=writer, args=('doc{}'.format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        forks = []
+        try:
+            for _ in range(200):
+                fork = fs.fork()
+                forks.append((fork, fork._data))
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        for fork, data in forks:
+            self.assertEqual(data, fork._data)
+
+    def test_client_restore_canBeRepeated(self):
+        fs = MockFirestore()
+        fs.collection('foo').document('first').set({'id': 1})
+        snapshot = fs.snapshot()
+        for value in (2, 3):
+            fs.collection('foo').document('first').set({'id': value})
+            fs.collection('bar').document('first').set({'id': value})
+            fs.restore(snapshot)
+            self.assertEqual({'id': 1}, fs.collection('foo').document('first').get().to_dict())
+            self.assertEqual([], list(fs.collection('bar').stream()))
+            self.assertEqual([], list(fs.collection_group('bar').stream()))
+
+    def test_client_restore_keepsExistingReferences(self):
+        fs = MockFirestore()
+        collection = fs.collection('c')
+        collection.document('a').set({'id': 1})
+        snapshot = fs.snapshot()
+        collection.document('a').set({'id': 2})
+        fs.restore(snapshot)
+        self.assertEqual({'id': 1}, collection.document('a').get().to_dict())
+        collection.document('b').set({'id': 3})
+        self.assertEqual(['a', 'b'], [doc.id for doc in fs.collection('c').stream()])
+        self.assertFalse(snapshot.get_fields(['c', 'b']))
+        fs.reset()
+        self.assertEqual([], list(collection.stream()))
+
+    def test_client_fork_keepsIndexesIndependent(self):
+        fs = MockFirestore()
+        fs.create_index('foo', 'status')
+        fs.collection('foo').document('first').set({'status': 'open'})
+        fork = fs.fork()
+        fork.collection('foo').document('second').set({'status': 'open'})
+        fs.collection('foo').document('first').update({'status': 'closed'})
+        self.assertEqual([], [doc.id for doc in fs.collection('foo').where('status', '==', 'open').stream()])
+        self.assertEqual(['first', 'second'],
+                         [doc.id for doc in fork.collection('foo').where('status', '==', 'open').stream()])
+
+    def test_client_document_deepPathParents(self):
+        fs = MockFirestore()
+        doc = fs.document('a/b/c/d/e/f')
+        self.assertEqual(['e', 'd', 'c', 'b', 'a'],
+                         [doc.parent.id, doc.parent.parent.id, doc.parent.parent.parent.id,
+                          doc.parent.parent.parent.parent.id, doc.parent.parent.parent.parent.parent.id])
+        self.assertIsNone(doc.parent.parent.parent.parent.parent.parent)
+        collection = fs.collection('a/b/c')
+        self.assertEqual('b', collection.parent.id)
+        self.assertEqual('a', collection.parent.parent.id)
 
+    def test_client_fork_afterCachedPaths(self):
+        fs = MockFirestore()
+        fs.document('foo/first/bar/sub').set({'id': 1})
+        fs.document('foo/first/bar/sub').get()
+        fork = fs.fork()
+        fork.document('foo/first/bar/sub').set({'id': 2})
+        self.assertEqual({'id': 1}, fs.document('foo/first/bar/sub').get().to_dict())
+        fs.document('foo/first/bar/sub').set({'id': 3})
+        self.assertEqual({'id': 2}, fork.document('foo/first/bar/sub').get().to_dict())
+        self.assertEqual({'id': 3}, fs.document('foo/first/bar/sub').get().to_dict())
+        fs.document('foo/first/bar/sub').delete()
+        self.assertFalse(fs.document('foo/first/bar/sub').get().exists)
+        fs.document('foo/first/bar/sub').set({'id': 4})
+        self.assertEqual({'id': 4}, fs.document('foo/first/bar/sub').get().to_dict())
+
+    def test_client_bulkLoad(self):
+        fs = MockFirestore()
+        fs.create_index('foo', 'n', kind='sorted')
+        fs.collection('foo').document('0').set({'n': -1})
+        loaded = fs.bulk_load('foo', ((str(i), {'n': i % 10}) for i in range(100)))
+        self.assertEqual(100, loaded)
+        self.assertEqual(100, fs.collection('foo').count().get()[0][0].value)
+        docs = list(fs.collection('foo').where('n', '>=', 9).stream())
+        self.assertEqual(['19', '29', '39', '49', '59', '69', '79', '89', '9', '99'], [doc.id for doc in docs])
+        self.assertEqual({'n': 0}, fs.collection('foo').document('0').get().to_dict())
+
+    def test_client_bulkLoad_nestedCollection(self):
+        fs = MockFirestore()
+        fs.bulk_load('foo/first/bar', [('a', {'x': 1})])
+        self.assertEqual({'x': 1}, fs.document('foo/first/bar/a').get().to_dict())
+        self.assertEqual(['a'], [doc.id for doc in fs.collection_group('bar').stream()])
+        with self.assertRaises(Exception):
+            fs.bulk_load('foo/first', [])
+
+    def test_client_loadNdjson(self):
+        fs = MockFirestore()
+        lines = StringIO('{"id": "a", "x": 1}\n\n{"id": "b", "x": 2}\n{"x": 3}\n')
+        self.assertEqual(3, fs.load_ndjson('foo', lines))
+        self.assertEqual({'id': 'a', 'x': 1}, fs.collection('foo').document('a').get().to_dict())
+        self.assertEqual([1, 2, 3], sorted(doc.get('x') for doc in fs.collection('foo').stream()))
+
+    def test_client_loadNdjson_numericIds(self):
+        fs = MockFirestore()
+        lines = StringIO('{"id": 1, "x": 1}\n{"id": "a", "x": 2}\n')
+        self.assertEqual(2, fs.load_ndjson('foo', lines))
+        self.assertEqual({'id': 1, 'x': 1}, fs.document('foo/1').get().to_dict())
+        self.assertEqual(['1', 'a'], [doc.id for doc in fs.collection('foo').stream()])
+
+    def test_client_loadJson(self):
+        fs = MockFirestore()
+        fs.load_json('foo', StringIO(json.dumps({'a': {'x': 1}})))
+        fs.load_json('bar', StringIO(json.dumps([{'key': 'b', 'x': 2}])), id_field='key')
+        self.assertEqual({'x': 1}, fs.collection('foo').document('a').get().to_dict())
+        self.assertEqual({'key': 'b', 'x': 2}, fs.collection('bar').document('b').get().to_dict())
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase
+
+from mockfirestore import MockFirestore
+
+
+class TestPersistence(TestCase):
+    def setUp(self):
+        self.fs = MockFirestore()
+        self.fs._data = {'foo': {
+            'first': {'num': 1, 'when': datetime(2020, 1, 2, tzinfo=timezone.utc),
+                      'map': {'list': [1, {'deep': b'bytes'}]},
+                      'bar': {'sub': {'num': 10}}},
+            'second': {'num': 2},
+        }}
+        self.fs.collection('foo').document('empty').collection('baz').document('x').set({'num': 3})
+        self.fs.create_index('foo', 'num', kind='sorted')
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'store.bin')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, self.path)
+        self.fs.save(self.path)
+
+    def test_persistence_roundTrip(self):
+        for lazy in (False, True):
+            loaded = MockFirestore()
+            loaded.load(self.path, lazy=lazy)
+            self.assertEqual(self.fs._data, loaded._data)
+            self.assertEqual(2, loaded.collection('foo').count().get()[0][0].value)
+            self.assertEqual(['x'], [doc.id for doc in loaded.collection_group('baz').stream()])
+
+    def test_persistence_keepsTimes(self):
+        loaded = MockFirestore()
+        loaded.load(self.path, lazy=True)
+        for path in ('foo/first', 'foo/empty/baz/x'):
+            saved = self.fs.document(path).get()
+            doc = loaded.document(path).get()
+            self.assertEqual(saved.create_time, doc.create_time)
+            self.assertEqual(saved.update_time, doc.update_time)
+        loaded.document('foo/first').update({'num': 5})
+        self.assertGreater(loaded.document('foo/first').get().update_time.nanoseconds,
+                           self.fs.document('foo/empty/baz/x').get().update_time.nanoseconds)
+
+    def test_persistence_keepsIndexes(self):
+        loaded = MockFirestore()
+        loaded.load(self.path)
+        self.assertEqual([(('foo',), 'num', 'sorted')], loaded._store.index_definitions())
+        docs = list(loaded.collection('foo').where('num', '>', 1).stream())
+        self.assertEqual(['second'], [doc.id for doc in docs])
+
+    def test_persistence_lazyDecodesOnFirstRead(self):
+        loaded = MockFirestore()
+        loaded.load(self.path, lazy=True)
+        documents = loaded._store.get_collection(['foo']).documents
+        # The sorted index on 'num' is loaded with the file, not rebuilt from the documents.
+        self.assertEqual(['first', 'second'], sorted(doc_id for doc_id, document in documents.items()
+                                                     if getattr(document, '_source', None) is not None))
+        self.assertEqual({'num': 1}, {'num': loaded.document('foo/first').get().get('num')})
+        self.assertIsNotNone(documents['second']._source)
+        self.assertEqual({'num': 2}, loaded.document('foo/second').get().to_dict())
+        self.assertIsNone(documents['second']._source)
+
+    def test_persistence_writesAfterLazyLoad(self):
+        loaded = MockFirestore()
+        loaded.load(self.path, lazy=True)
+        loaded.document('foo/second').update({'num': 5})
+        loaded.document('foo/first').delete()
+        self.assertEqual({'num': 5}, loaded.document('foo/second').get().to_dict())
+        self.assertEqual(['second'], [doc.id for doc in loaded.collection('foo').where('num', '>', 1).stream()])
+        self.assertEqual({'num': 10}, loaded.document('foo/first/bar/sub').get().to_dict())
+
+    def test_persistence_rejectsOtherFiles(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a store at all')
+        with self.assertRaises(ValueError):
+            MockFirestore().load(self.path)
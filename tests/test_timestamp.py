@@ -1,7 +1,7 @@
 import unittest
-from datetime import datetime as dt
+from datetime import datetime as dt, timezone
 
-from mockfirestore import Timestamp
+from mockfirestore import MockFirestore, Timestamp
 
 
 class TestTimestamp(unittest.TestCase):
@@ -9,7 +9,52 @@ class TestTimestamp(unittest.TestCase):
         dt_timestamp = dt.now().timestamp()
         timestamp = Timestamp(dt_timestamp)
 
-        seconds, nanos = str(dt_timestamp).split('.')
-        self.assertEqual(seconds, timestamp.seconds)
-        self.assertEqual(nanos, timestamp.nanos)
+        self.assertEqual(int(dt_timestamp), timestamp.seconds)
+        self.assertAlmostEqual(dt_timestamp % 1, timestamp.nanos / 1e9, places=6)
 
+    def test_timestamp_protobufFields(self):
+        self.assertEqual((1, 0), (Timestamp(1.0).seconds, Timestamp(1.0).nanos))
+        self.assertEqual((0, 1000), (Timestamp(1e-06).seconds, Timestamp(1e-06).nanos))
+        timestamp = Timestamp(seconds=1700000000, nanos=123456789)
+        self.assertEqual(1700000000123456789, timestamp.nanoseconds)
+        self.assertEqual((1700000000, 123456789), (timestamp.seconds, timestamp.nanos))
+        before_epoch = Timestamp.from_nanoseconds(-1)
+        self.assertEqual((-1, 999999999), (before_epoch.seconds, before_epoch.nanos))
+
+    def test_timestamp_orderingAndHashing(self):
+        first = Timestamp.from_nanoseconds(1700000000000000001)
+        second = Timestamp.from_nanoseconds(1700000000000000002)
+        self.assertLess(first, second)
+        self.assertGreaterEqual(second, first)
+        self.assertEqual(first, Timestamp(seconds=1700000000, nanos=1))
+        self.assertEqual(1, len({first, Timestamp.from_nanoseconds(first.nanoseconds)}))
+        self.assertEqual([first, second], sorted([second, first]))
+
+    def test_timestamp_toDatetime(self):
+        when = dt(2020, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+        timestamp = Timestamp.from_datetime(when)
+        self.assertEqual(when, timestamp.to_datetime())
+        self.assertEqual(when, Timestamp.from_nanoseconds(timestamp.nanoseconds + 999).to_datetime())
+
+    def test_timestamp_queryOrdering(self):
+        fs = MockFirestore()
+        fs._data = {'foo': {
+            'first': {'when': Timestamp(seconds=10, nanos=2)},
+            'second': {'when': dt(1970, 1, 1, 0, 0, 10, tzinfo=timezone.utc)},
+            'third': {'when': Timestamp(seconds=10, nanos=1)},
+        }}
+        fs.create_index('foo', 'when', kind='sorted')
+        docs = fs.collection('foo').order_by('when').stream()
+        self.assertEqual(['second', 'third', 'first'], [doc.id for doc in docs])
+        docs = fs.collection('foo').where('when', '>', Timestamp(seconds=10, nanos=1)).stream()
+        self.assertEqual(['first'], [doc.id for doc in docs])
+
+    def test_timestamp_naiveDatetimeIsLocalTime(self):
+        when = dt(2020, 1, 2, 3, 4, 5, 678901)
+        timestamp = Timestamp.from_datetime(when)
+        self.assertEqual(int(when.timestamp()), timestamp.seconds)
+        self.assertEqual(678901000, timestamp.nanos)
+        fs = MockFirestore()
+        fs._data = {'foo': {'first': {'when': when}, 'second': {'when': dt(2020, 1, 1)}}}
+        docs = fs.collection('foo').where('when', '>', dt(2020, 1, 1, 12)).stream()
+        self.assertEqual(['first'], [doc.id for doc in docs])
@@ -1,5 +1,6 @@
+from threading import Thread
 from unittest import TestCase
-from mockfirestore import MockFirestore, Transaction
+from mockfirestore import Aborted, MockFirestore, NotFound, Transaction, transactional
 
 
 class TestTransaction(TestCase):
@@ -71,3 +72,100 @@ class TestTransaction(TestCase):
 
 
 
+
+    def test_transaction_commit_abortsWhenReadDocumentChanged(self):
+        doc = self.fs.collection('foo').document('first')
+        transaction = Transaction(self.fs)
+        transaction._begin()
+        next(transaction.get(doc))
+        doc.update({'id': 10})
+        transaction.update(doc, {'id': 2})
+        with self.assertRaises(Aborted):
+            transaction.commit()
+        self.assertEqual({'id': 10}, doc.get().to_dict())
+
+    def test_transaction_commit_abortsWhenQueryResultChanged(self):
+        transaction = Transaction(self.fs)
+        transaction._begin()
+        docs = list(transaction.get(self.fs.collection('foo').where('id', '==', 1)))
+        self.fs.collection('foo').document('first').delete()
+        transaction.set(docs[0].reference, {'id': 3})
+        with self.assertRaises(Aborted):
+            transaction.commit()
+
+    def test_transaction_commit_ignoresUnrelatedWrites(self):
+        doc = self.fs.collection('foo').document('first')
+        transaction = Transaction(self.fs)
+        transaction._begin()
+        list(transaction.get_all([doc]))
+        self.fs.collection('foo').document('second').update({'id': 20})
+        transaction.update(doc, {'id': 2})
+        transaction.commit()
+        self.assertEqual({'id': 2}, doc.get().to_dict())
+
+    def test_transaction_commit_isAllOrNothing(self):
+        first = self.fs.collection('foo').document('first')
+        missing = self.fs.collection('foo').document('missing')
+        transaction = Transaction(self.fs)
+        transaction._begin()
+        transaction.set(first, {'id': 10})
+        transaction.update(missing, {'id': 11})
+        with self.assertRaises(NotFound):
+            transaction.commit()
+        self.assertEqual({'id': 1}, first.get().to_dict())
+
+    def test_transaction_commit_reportsWriteTimes(self):
+        doc = self.fs.collection('foo').document('first')
+        transaction = Transaction(self.fs)
+        transaction._begin()
+        transaction.update(doc, {'id': 10})
+        results = transaction.commit()
+        self.assertEqual([doc.get().update_time], [result.update_time for result in results])
+
+    def test_transactional_retriesOnConflict(self):
+        doc = self.fs.collection('foo').document('first')
+        attempts = []
+
+        @transactional
+        def increment(transaction, reference):
+            value = next(transaction.get(reference)).get('id')
+            attempts.append(value)
+            if len(attempts) == 1:
+                reference.update({'id': 100})
+            transaction.update(reference, {'id': value + 1})
+
+        increment(self.fs.transaction(), doc)
+        self.assertEqual([1, 100], attempts)
+        self.assertEqual({'id': 101}, doc.get().to_dict())
+
+    def test_transactional_failsAfterMaxAttempts(self):
+        doc = self.fs.collection('foo').document('first')
+
+        @transactional
+        def always_conflicts(transaction, reference):
+            next(transaction.get(reference))
+            reference.update({'touched': True})
+            transaction.update(reference, {'id': 2})
+
+        with self.assertRaises(ValueError):
+            always_conflicts(self.fs.transaction(max_attempts=3), doc)
+        self.assertEqual({'id': 1, 'touched': True}, doc.get().to_dict())
+
+    def test_transactional_concurrentIncrements(self):
+        doc = self.fs.collection('foo').document('first')
+
+        @transactional
+        def increment(transaction, reference):
+            value = next(transaction.get(reference)).get('id')
+            transaction.update(reference, {'id': value + 1})
+
+        def worker():
+            for _ in range(50):
+                increment(self.fs.transaction(max_attempts=1000), doc)
+
+        threads = [Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({'id': 201}, doc.get().to_dict())
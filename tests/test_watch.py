@@ -0,0 +1,124 @@
+from queue import Queue
+from unittest import TestCase
+
+from mockfirestore import MockFirestore
+from mockfirestore.watch import ChangeType
+
+
+class Listener:
+    def __init__(self):
+        self.events = Queue()
+
+    def __call__(self, snapshots, changes, read_time):
+        self.events.put((snapshots, changes))
+
+    def next(self):
+        snapshots, changes = self.events.get(timeout=5)
+        return ([snapshot.id for snapshot in snapshots],
+                [(change.type, change.document.id, change.old_index, change.new_index)
+                 for change in changes])
+
+
+class TestWatch(TestCase):
+    def setUp(self):
+        self.fs = MockFirestore()
+        self.fs._data = {'foo': {
+            'first': {'id': 1},
+            'second': {'id': 2},
+            'third': {'id': 3},
+        }}
+        self.listener = Listener()
+
+    def test_watch_query_deliversInitialResults(self):
+        self.fs.collection('foo').where('id', '>', 1).on_snapshot(self.listener)
+        self.assertEqual((['second', 'third'], [(ChangeType.ADDED, 'second', -1, 0),
+                                                (ChangeType.ADDED, 'third', -1, 1)]),
+                         self.listener.next())
+
+    def test_watch_query_reportsAddedModifiedRemoved(self):
+        collection = self.fs.collection('foo')
+        collection.order_by('id', direction='DESCENDING').on_snapshot(self.listener)
+        self.listener.next()
+        collection.document('fourth').set({'id': 4})
+        self.assertEqual((['fourth', 'third', 'second', 'first'], [(ChangeType.ADDED, 'fourth', -1, 0)]),
+                         self.listener.next())
+        collection.document('first').update({'id': 5})
+        self.assertEqual((['first', 'fourth', 'third', 'second'], [(ChangeType.MODIFIED, 'first', 3, 0)]),
+                         self.listener.next())
+        collection.document('third').delete()
+        self.assertEqual((['first', 'fourth', 'second'], [(ChangeType.REMOVED, 'third', 2, -1)]),
+                         self.listener.next())
+
+    def test_watch_query_ignoresWritesOutsideResults(self):
+        collection = self.fs.collection('foo')
+        collection.where('id', '<', 3).on_snapshot(self.listener)
+        self.listener.next()
+        collection.document('third').update({'id': 30})
+        self.fs.collection('bar').document('first').set({'id': 1})
+        collection.document('second').update({'id': 10})
+        self.assertEqual((['first'], [(ChangeType.REMOVED, 'second', 1, -1)]), self.listener.next())
+        self.assertTrue(self.listener.events.empty())
+
+    def test_watch_query_limitReportsDocumentsEnteringWindow(self):
+        collection = self.fs.collection('foo')
+        collection.order_by('id').limit(2).on_snapshot(self.listener)
+        self.listener.next()
+        collection.document('first').delete()
+        self.assertEqual((['second', 'third'], [(ChangeType.REMOVED, 'first', 0, -1),
+                                                (ChangeType.ADDED, 'third', -1, 1)]),
+                         self.listener.next())
+
+    def test_watch_batchWrites(self):
+        collection = self.fs.collection('foo')
+        collection.on_snapshot(self.listener)
+        self.listener.next()
+        batch = self.fs.batch()
+        batch.delete(collection.document('second'))
+        batch.set(collection.document('fourth'), {'id': 4})
+        batch.commit()
+        self.assertEqual((['first', 'third'], [(ChangeType.REMOVED, 'second', 1, -1)]), self.listener.next())
+        self.assertEqual((['first', 'fourth', 'third'], [(ChangeType.ADDED, 'fourth', -1, 1)]),
+                         self.listener.next())
+
+    def test_watch_collectionGroup(self):
+        self.fs.collection_group('bar').on_snapshot(self.listener)
+        self.assertEqual(([], []), self.listener.next())
+        self.fs.collection('foo/first/bar').document('sub').set({'id': 10})
+        self.assertEqual((['sub'], [(ChangeType.ADDED, 'sub', -1, 0)]), self.listener.next())
+
+    def test_watch_document(self):
+        doc = self.fs.collection('foo').document('first')
+        doc.on_snapshot(self.listener)
+        self.assertEqual((['first'], [(ChangeType.ADDED, 'first', -1, 0)]), self.listener.next())
+        doc.update({'id': 10})
+        self.assertEqual((['first'], [(ChangeType.MODIFIED, 'first', 0, 0)]), self.listener.next())
+        doc.delete()
+        self.assertEqual(([], [(ChangeType.REMOVED, 'first', 0, -1)]), self.listener.next())
+
+    def test_watch_followsRestore(self):
+        collection = self.fs.collection('foo')
+        snapshot = self.fs.snapshot()
+        collection.where('id', '>', 1).on_snapshot(self.listener)
+        self.listener.next()
+        collection.document('second').delete()
+        self.listener.next()
+        collection.document('third').update({'id': 30})
+        self.listener.next()
+        self.fs.restore(snapshot)
+        self.assertEqual((['second', 'third'], [(ChangeType.ADDED, 'second', -1, 0),
+                                                (ChangeType.MODIFIED, 'third', 0, 1)]),
+                         self.listener.next())
+        collection.document('fourth').set({'id': 4})
+        self.assertEqual((['fourth', 'second', 'third'], [(ChangeType.ADDED, 'fourth', -1, 0)]),
+                         self.listener.next())
+
+    def test_watch_unsubscribe(self):
+        doc = self.fs.collection('foo').document('first')
+        watch = doc.on_snapshot(self.listener)
+        self.listener.next()
+        watch.unsubscribe()
+        doc.update({'id': 10})
+        other = Listener()
+        doc.on_snapshot(other)
+        other.next()
+        self.assertTrue(self.listener.events.empty())